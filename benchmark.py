@@ -0,0 +1,234 @@
+# benchmarks of the posit library and of the log validator
+# usage: python benchmark.py [--sizes 8 16 32] [--types bin hex] [--lines 100000] [--repeat 3] [--output bench.jsonl]
+#
+# for every N and digit type:
+#   - a synthetic FMA log is written in the work folder, with correct, rounded, wrong and discarded lines
+#   - the log is validated with every reader and checking mode, measuring lines per second
+#   - every fast mode is cross-checked with the line by line mode: counters and the decision on every line must be the
+#     same (the decisions are written to a sink in a run of their own, not measured), for the log and for the same
+#     lines split in several logs, the first one ending with a truncated line
+# then the functions of simplePositLib are timed on random encodings
+# results are appended to the output file as one JSON object per run, so that runs can be compared over time
+# the exit status is 1 if a cross-check fails
+import argparse
+import csv
+import hashlib
+import json
+import platform
+import random
+import subprocess
+import sys
+from os import makedirs
+from os.path import join
+from time import perf_counter, strftime
+
+import fma_log_extractor
+from fma_log_extractor import LogValidator, ValidatorConfig
+from simplePositLib import *
+
+# ---------------------------------------------------------------
+# ----------------------- CONFIGURATION -------------------------
+work_folder = "bench_logs"  # folder where the synthetic logs (and the decisions of the cross-checks) are written
+output_file = "bench_results.jsonl"  # file where the results are appended
+lines_per_log = 100000  # lines of each synthetic log
+split_logs = 3  # logs the synthetic log is split in, for the cross-check of runs over several logs
+function_samples = 2000  # random encodings given to each function
+repeat = 3  # runs of each measure; the fastest one is kept
+# readers and checking modes of the validator: (name, reference mode, options)
+# a mode is cross-checked with its reference, that reads the log line by line with the same criterion
+validator_modes = [
+    ("line", None, {}),
+    ("batch", "line", {"batch_size": 10000}),
+    ("mmap", "line", {"reader": "mmap", "batch_size": 10000}),
+    ("pipeline", "line", {"pipeline": True}),
+    ("parallel", "line", {"processes": 2, "shard_bytes": 1024 * 1024}),
+    ("memo", "line", {"memo_size": 100000}),
+    ("exact-line", None, {"exact_reference": True}),
+    ("exact-batch", "exact-line", {"exact_reference": True, "batch_size": 10000}),
+]
+
+
+# ---------------------------------------------------------------
+# ------------------------- FUNCTIONS ---------------------------
+# a random code of a format, NaR excluded
+def random_code(rng, p_size):
+    while True:
+        code = rng.getrandbits(p_size)
+        if code != 1 << (p_size - 1):
+            return code
+
+
+# write a synthetic log: most outputs are correct, the others are one posit away, random or discarded
+def write_log(file_name, lines, p_size, es_size, digit_type, seed=0):
+    rng = random.Random(seed)
+    digits = p_size // 4 if digit_type == "hex" else p_size
+    pattern = "0" + str(digits) + ("x" if digit_type == "hex" else "b")
+    mask = (1 << p_size) - 1
+    previous = None
+    with open(file_name, "w") as f:
+        for _ in range(lines):
+            while True:
+                a, b, c = random_code(rng, 2 * p_size), random_code(rng, p_size), random_code(rng, p_size)
+                out, _ = posit_fma(a, b, c, p_size, es_size, 2 * p_size)
+                kind = rng.random()
+                flag = "1"
+                if kind < 0.05:
+                    flag = "x"
+                elif kind < 0.15:
+                    out = (out + rng.choice((-1, 1))) & mask
+                elif kind < 0.25:
+                    out = random_code(rng, p_size)
+                line = ("i " + format(a, "0" + str(2 * digits) + pattern[-1]) + format(b, pattern) + format(c, pattern)
+                        + " o " + flag + format(out, pattern))
+                # a repeated line would end the log
+                if line != previous:
+                    break
+            f.write(line + "\n")
+            previous = line
+
+
+# split a log in several logs in a folder of their own; the first one ends with half of its next line, without
+# terminator, as a log whose simulation was interrupted
+def write_split_logs(folder, file_name, parts):
+    with open(join(folder, file_name)) as f:
+        lines = f.readlines()
+    split_folder = join(folder, "split_" + file_name.rsplit(".", 1)[0])
+    makedirs(split_folder, exist_ok=True)
+    names = []
+    size = -(-len(lines) // parts)
+    for part in range(parts):
+        names.append("part_" + str(part) + "_" + file_name)
+        with open(join(split_folder, names[-1]), "w") as f:
+            f.writelines(lines[part * size:(part + 1) * size])
+            if part == 0 and size < len(lines):
+                f.write(lines[size][:len(lines[size]) // 2])
+    # returns the folder and the names of the logs, in the order they are validated
+    return split_folder, names
+
+
+# fastest of some runs of a function
+def best_time(function, runs):
+    times = []
+    for _ in range(runs):
+        start = perf_counter()
+        result = function()
+        times.append(perf_counter() - start)
+    # returns the time in seconds, and the result of the last run
+    return min(times), result
+
+
+# counters of a validation of some logs, and a hash of the decision on every line, used to compare the modes
+def fingerprint(options, file_names, sink_file):
+    # $options: options of the validator of the mode
+    # $file_names: the logs validated as a single run
+    # $sink_file: CSV file where the decisions are written
+    validator = LogValidator(ValidatorConfig(sink_file=sink_file, sink_limits={msg: -1 for msg in "veaox"},
+                                             **options))
+    stats = validator.validate_files(file_names)
+    validator.close_sink()
+    digest = hashlib.sha256()
+    with open(sink_file, newline="") as f:
+        for row in csv.DictReader(f):
+            digest.update((row["file"] + " " + row["file_line"] + " " + row["decision"] + "\n").encode())
+    # returns a list of counters, and the hash of the (line, decision) pairs in the order of the lines
+    return [stats.read, stats.correct, stats.mistakes, stats.approx_ok, stats.approx_no, stats.discarded,
+            digest.hexdigest()]
+
+
+# validate a log with every mode, measuring lines per second and cross-checking the fast modes
+def bench_validator(folder, file_name, p_size, es_size, digit_type, runs):
+    split_folder, split_names = write_split_logs(folder, file_name, split_logs)
+    results = []
+    fingerprints = {}
+    for name, reference, options in validator_modes:
+        options = dict(path=folder, N=p_size, ES=es_size, input_type=digit_type, output_type=digit_type, quiet=True,
+                       verbose=False, show_progress=False, limit_rows_per_file=-1, **options)
+        config = ValidatorConfig(**options)
+        seconds, stats = best_time(lambda: LogValidator(config).validate_file(file_name), runs)
+        sink_file = join(folder, "decisions.csv")
+        fingerprints[name] = (fingerprint(options, [file_name], sink_file)
+                              + fingerprint(dict(options, path=split_folder), split_names, sink_file))
+        result = {"N": p_size, "ES": es_size, "input_type": digit_type, "mode": name, "lines": stats.read,
+                  "seconds": seconds, "lines_per_second": stats.read / seconds if seconds > 0 else None}
+        if reference is not None:
+            result["consistent"] = fingerprints[name] == fingerprints[reference]
+        results.append(result)
+        print(p_size, digit_type, name, stats.read, "lines", round(result["lines_per_second"] or 0), "lines/s",
+              "" if reference is None else ("consistent" if result["consistent"] else "NOT CONSISTENT"))
+    # returns a list of results, one per mode
+    return results
+
+
+# time the functions of simplePositLib on random encodings of a format
+def bench_functions(p_size, es_size, samples, runs, seed=0):
+    rng = random.Random(seed)
+    codes = [random_code(rng, p_size) for _ in range(samples)]
+    wide = [random_code(rng, 2 * p_size) for _ in range(samples)]
+    bits = [format(code, "0" + str(p_size) + "b") for code in codes]
+    hexes = [format(code, "0" + str(p_size // 4) + "x") for code in codes]
+    values = [decode_posit(code, p_size, es_size) for code in codes]
+    one = "1".zfill(p_size)
+    functions = {
+        "posit2real": lambda: [posit2real(b, p_size, es_size) for b in bits],
+        "decode_posit": lambda: [decode_posit(c, p_size, es_size) for c in codes],
+        "lookup_posit": lambda: [lookup_posit(c, p_size, es_size) for c in codes],
+        "get_regime": lambda: [get_regime(b, p_size) for b in bits],
+        "a2comp": lambda: [a2comp(b, p_size) for b in bits],
+        "binary_sum": lambda: [binary_sum(p_size, b, one) for b in bits],
+        "binary_diff": lambda: [binary_diff(p_size, b, one) for b in bits],
+        "posit_neighbours": lambda: [posit_neighbours(c, 1, p_size) for c in codes],
+        "hex2bit": lambda: [hex2bit(h, p_size) for h in hexes],
+        "isRepresentable": lambda: [isRepresentable(v, p_size, es_size) for v in values],
+        "posit_fma": lambda: [posit_fma(a, b, c, p_size, es_size, 2 * p_size)
+                              for a, b, c in zip(wide, codes, reversed(codes))],
+        "code_distance": lambda: [code_distance(a, b, p_size) for a, b in zip(codes, reversed(codes))],
+    }
+    results = []
+    for name, function in functions.items():
+        seconds, _ = best_time(function, runs)
+        results.append({"N": p_size, "ES": es_size, "function": name, "calls": samples,
+                        "ns_per_call": seconds / samples * 1e9})
+        print(p_size, name, round(seconds / samples * 1e9), "ns/call")
+    # returns a list of results, one per function
+    return results
+
+
+# commit of the code being measured, if it is in a git repository
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ---------------------------------------------------------------
+# ------------------------- MAIN BODY ---------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the posit library and the log validator")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[8, 16, 32], help="values of N")
+    parser.add_argument("--es", type=int, default=0, help="exponent bits")
+    parser.add_argument("--types", nargs="+", choices=("bin", "hex"), default=["bin", "hex"], help="digit types")
+    parser.add_argument("--lines", type=int, default=lines_per_log, help="lines of each synthetic log")
+    parser.add_argument("--samples", type=int, default=function_samples, help="random encodings per function")
+    parser.add_argument("--repeat", type=int, default=repeat, help="runs of each measure")
+    parser.add_argument("--folder", default=work_folder, help="folder of the synthetic logs")
+    parser.add_argument("--output", default=output_file, help="file where the results are appended")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random generator")
+    args = parser.parse_args()
+    makedirs(args.folder, exist_ok=True)
+    run = {"time": strftime("%Y-%m-%dT%H:%M:%S"), "commit": git_commit(), "python": platform.python_version(),
+           "machine": platform.machine(), "numpy": fma_log_extractor.np is not None, "lines": args.lines,
+           "validator": [], "functions": []}
+    for p_size in args.sizes:
+        warm_decode_tables([(2 * p_size, args.es), (p_size, args.es)])
+        for digit_type in args.types:
+            name = "bench_" + str(p_size) + "_" + digit_type + ".log"
+            write_log(join(args.folder, name), args.lines, p_size, args.es, digit_type, args.seed)
+            run["validator"] += bench_validator(args.folder, name, p_size, args.es, digit_type, args.repeat)
+        run["functions"] += bench_functions(p_size, args.es, args.samples, args.repeat, args.seed)
+    with open(args.output, "a") as f:
+        f.write(json.dumps(run) + "\n")
+    print("Results appended to ", args.output)
+    if not all(result.get("consistent", True) for result in run["validator"]):
+        sys.exit("A fast mode changed the classification of some lines")
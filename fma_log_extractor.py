@@ -1,51 +1,631 @@
 # python decoder for output.log
-from os import listdir
-from os.path import isfile, join
+# usage: python fma_log_extractor.py [--path logs] [--N 16] [--ES 0] [--input-type bin] ... (see --help)
+#   validates all the logs in the folder whose name contains N, then outputs a report
+#   options not given on the command line take the values of the CONFIGURATION section
+#   logs compressed with gzip (.gz) or zstd (.zst, requires zstandard) are decompressed while they are read
+#   with --result-cache, the results of the logs are stored by content hash, and unchanged logs are not read again
+#   with --histogram-file, the distribution of the errors is saved as JSON or CSV (see ErrorHistograms)
+#   with --coordinator host:port, the shards of the text logs are handed out to workers on this machine and on other
+#   ones, started with: python fma_log_extractor.py --worker host:port --coordinator-key KEY (see work_queue.py);
+#   the key is required unless the coordinator listens on localhost, since whoever knows it can run code on both sides
+#   with --golden, the logs are compared line by line with the logs of a golden model (see DifferentialStats)
+#
+# the validation can also be used as a library; nothing is read or computed at import time:
+#   validator = LogValidator(ValidatorConfig(N=8, path="logs", quiet=True))
+#   stats = validator.validate_file("fma_8.log")         # ValidationStats of the file
+#   stats.merge(validator.validate_file("fma_8_2.log"))  # statistics of consecutive logs can be merged
+# every validator has its own configuration, so several formats can be validated in the same process
+# logs of other operations than the FMA (add, mul, div, dot, or any in operations.py) are checked with --operation
+import argparse
+import csv
+import gzip
+import hashlib
+import json
+import sys
+from collections import OrderedDict, deque
+from contextlib import closing
+from itertools import zip_longest
+from math import frexp, inf, isfinite
+from mmap import ACCESS_READ, mmap
+from multiprocessing import Pool
+from operator import itemgetter
+from os import listdir, makedirs, remove, replace
+from os.path import getsize, isdir, isfile, join
+from queue import Empty, Full, Queue
+from threading import Event, Thread
+from time import monotonic, perf_counter, sleep
+from operations import get_operation, operations
 from simplePositLib import *
+from work_queue import Coordinator, is_loopback, parse_address, run_worker
+
+try:
+    import numpy as np
+    from log_formats import digit_sizes, map_text_log, packed_extension, parse_records, read_packed
+    from vectorPositLib import bit_length, code_distances, decode_posits, encode_posits
+except ImportError:  # batch mode and packed logs require NumPy
+    np = None
+    packed_extension = ".plog"
+
+try:
+    import zstandard
+except ImportError:  # logs compressed with zstd require zstandard
+    zstandard = None
 
 # ---------------------------------------------------------------
 # ----------------------- CONFIGURATION -------------------------
+# default values of ValidatorConfig
 verbose = True  # output more data to console; True => VERY SLOW to execute
 show_progress = True  # output in console how many lines have been read
+progress_interval = 1  # seconds between two progress messages
+quiet = False  # no console output at all (e.g. when the validator is used as a library)
 path = 'logs'  # folder containing the .log files
 rounding_tolerance = 1  # how many consecutive posits are considered a correct approximation
 limit_rows_per_file = -1  # max lines per file to read; put -1 to read the whole file.
 limit_errors_to_display = 50  # max errors to output in console as samples; put -1 for infinite
 input_type = "bin"  # "bin" or "hex" to select if log file contains binary or hexadecimals
 output_type = "bin"  # "bin" or "hex" to select if log file contains binary or hexadecimals
+reader = "text"  # "text" reads lines one by one; "mmap" maps fixed-width logs in memory and parses them with NumPy
+batch_size = 0  # lines checked together with NumPy (e.g. 1000000); 0 to check one line at a time. Ignored if verbose
+exact_reference = False  # compare encodings with the exact A+B*C rounded to a posit, instead of float errors
+operation = "fma"  # operation whose logs are validated (see operations.py): "fma" is A+B*C with A on 2N bits
+processes = 0  # worker processes validating shards of the logs in parallel; 0 to validate in this process
+shard_bytes = 8 * 1024 * 1024  # size of the byte ranges given to each worker
+# shards can be handed out through a socket to workers on other machines, reading the logs from the same path
+# the messages are pickled: a coordinator reachable from other machines must have a secret key (see work_queue.py)
+coordinator = None  # "host:port" where workers connect to take shards (e.g. "0.0.0.0:6000"); None to use processes
+coordinator_key = None  # secret key shared by the coordinator and its workers; None for a random key, on localhost only
+local_workers = 0  # worker processes started on this machine by the coordinator
+shard_retries = 3  # times a shard is given again after its worker died, failed or timed out
+shard_timeout = -1  # seconds after which a shard is given to another worker; -1 to wait for its worker
+worker = None  # "host:port" of a coordinator: validate the shards it hands out, instead of the logs of path
+worker_idle = -1  # seconds without a coordinator after which a worker stops; -1 to wait for coordinators forever
+checkpoint_file = None  # file where the state of the run is saved, to resume it if interrupted; None to disable
+checkpoint_interval = 5  # seconds between two checkpoints
+follow = False  # validate the lines appended to the logs while they are written, instead of reading them once
+follow_interval = 1  # seconds between two polls of the logs, in follow mode
+follow_idle = -1  # seconds without new lines after which follow mode ends; -1 to follow until interrupted
+follow_read_bytes = 8 * 1024 * 1024  # max bytes read from a log at a time, in follow mode
+max_mistakes = -1  # follow mode stops after this many mistakes (fail fast); -1 to never stop
+profile = False  # measure time and calls of each stage, and count the lines taking each classification path
+profile_file = None  # JSON file where the profile is saved at the end of the run; None to only show it in the report
+memo_size = 0  # entries of the caches of decoded values and of classifications (LRU); 0 to disable them
+pipeline = False  # read and split the text logs in background threads, overlapping I/O and decompression with checks
+pipeline_block_bytes = 4 * 1024 * 1024  # bytes read at a time by the pipeline
+pipeline_depth = 4  # blocks queued between two stages of the pipeline
+# checked lines can be written to a JSONL or CSV file (chosen by its extension), instead of the console
+sink_file = None  # file where samples of the checked lines are written; None to disable
+sink_limits = {"e": -1, "o": -1, "a": 0, "v": 0, "x": 0}  # max lines written for each decision; -1 for infinite
+# results of the logs can be stored by content hash, so that the next runs skip the logs that did not change
+# (not used with a sink or a checkpoint file, that need every line to be read)
+result_cache = None  # folder where the results are stored; None to disable
+hash_block_bytes = 16 * 1024 * 1024  # bytes hashed at a time
+# distribution of the errors of the checked lines, by sign, regime and exponent of the expected result
+histograms = False  # count the errors in histograms of code distances and relative errors
+histogram_file = None  # JSON or CSV file (chosen by its extension) where the histograms are saved; None to not save
+relative_error_range = (-64, 0)  # binary exponents of the first and last bucket of relative errors
+# differential mode: the outputs of the logs are compared with the ones of a trusted golden model (e.g. SoftPosit or
+# a previous release of the design), matching the lines by their operands, instead of checking them with the reference
+golden = None  # golden log, or folder of golden logs with the names of the logs of path; None to disable
 # parameter to work with:
 N = 16  # bits on which each posit is allocated
 ES = 0  # bits reserved for exponent, in a posit string
+
+
 # ---------------------------------------------------------------
 # ------------------------- PARAMETERS --------------------------
-# expected input size:
-A_binary_len = N * 2
-B_binary_len = N
-C_binary_len = N
-Out_binary_len = N
-# expected hex size:
-A_h_len = int(A_binary_len / 4)
-B_h_len = int(B_binary_len / 4)
-C_h_len = int(C_binary_len / 4)
-Out_h_len = int(Out_binary_len / 4)
-# dataset files
-files = [f for f in listdir(path) if isfile(join(path, f))]
+# text logs with these extensions are decompressed while they are read (e.g. fma_16.log.gz)
+compressed_extensions = (".gz", ".zst")
+# version of the results stored in the result cache; results of other versions are ignored
+result_cache_version = 1
+
+
+# options of a validation run; unless given, they take the values of the CONFIGURATION section
+class ValidatorConfig:
+    def __init__(self, **options):
+        self.verbose = verbose
+        self.show_progress = show_progress
+        self.progress_interval = progress_interval
+        self.quiet = quiet
+        self.path = path
+        self.rounding_tolerance = rounding_tolerance
+        self.limit_rows_per_file = limit_rows_per_file
+        self.limit_errors_to_display = limit_errors_to_display
+        self.input_type = input_type
+        self.output_type = output_type
+        self.reader = reader
+        self.batch_size = batch_size
+        self.exact_reference = exact_reference
+        self.operation = operation
+        self.processes = processes
+        self.shard_bytes = shard_bytes
+        self.coordinator = coordinator
+        self.coordinator_key = coordinator_key
+        self.local_workers = local_workers
+        self.shard_retries = shard_retries
+        self.shard_timeout = shard_timeout
+        self.worker = worker
+        self.worker_idle = worker_idle
+        self.checkpoint_file = checkpoint_file
+        self.checkpoint_interval = checkpoint_interval
+        self.follow = follow
+        self.follow_interval = follow_interval
+        self.follow_idle = follow_idle
+        self.follow_read_bytes = follow_read_bytes
+        self.max_mistakes = max_mistakes
+        self.profile = profile
+        self.profile_file = profile_file
+        self.memo_size = memo_size
+        self.pipeline = pipeline
+        self.pipeline_block_bytes = pipeline_block_bytes
+        self.pipeline_depth = pipeline_depth
+        self.sink_file = sink_file
+        self.sink_limits = dict(sink_limits)
+        self.result_cache = result_cache
+        self.hash_block_bytes = hash_block_bytes
+        self.histograms = histograms
+        self.histogram_file = histogram_file
+        self.relative_error_range = relative_error_range
+        self.golden = golden
+        self.N = N
+        self.ES = ES
+        for name, value in options.items():
+            if name not in self.__dict__:
+                raise TypeError("unknown option: " + name)
+            setattr(self, name, value)
+
+
 # ---------------------------------------------------------------
-# ------------------------- VARIABLES ---------------------------
-# statistics
-Correct = 0
-Mistakes = 0
-Read = 0
-Approx_ok = 0
-Approx_no = 0
-Discarded = 0
-last_msg = ""
-errors_displayed = 0
-last_line_read = 0
+# ------------------------- STATISTICS --------------------------
+# counters of a validation run; the statistics of consecutive parts of the logs can be merged
+class ValidationStats:
+    def __init__(self, max_errors=-1, sample_limits=None, histograms=None):
+        # $max_errors: max samples of wrong lines to keep; -1 for infinite
+        # $sample_limits: max samples of the lines of each decision to keep for the sink; -1 for infinite
+        # $histograms: ErrorHistograms where the checked lines are counted; None to not count them
+        self.max_errors = max_errors
+        self.sample_limits = sample_limits if sample_limits is not None else {}
+        self.read = 0
+        self.correct = 0
+        self.mistakes = 0
+        self.approx_ok = 0
+        self.approx_no = 0
+        self.discarded = 0
+        # samples of wrong lines: (line, a_b, b_b, c_b, out_b, a_f, b_f, c_f, out_f, e) for the FMA
+        self.errors = []
+        # samples of checked lines for the sink: (line, decision, values or None); they are removed once written
+        self.samples = []
+        self.sampled = {}  # decision -> samples taken, written ones included
+        self.histograms = histograms
+
+    # store a sample of a wrong line, if the limit of samples has not been reached yet
+    def add_error(self, sample):
+        if self.max_errors != -1 and len(self.errors) >= self.max_errors:
+            return False
+        self.errors.append(sample)
+        # returns True if the sample has been stored
+        return True
+
+    # True if samples of the lines of a decision can still be stored
+    def wants_samples(self, msg):
+        limit = self.sample_limits.get(msg, 0)
+        return limit == -1 or self.sampled.get(msg, 0) < limit
+
+    # store a sample of a checked line for the sink, if the limit of its decision has not been reached yet
+    def add_sample(self, line, msg, values):
+        if not self.wants_samples(msg):
+            return False
+        self.sampled[msg] = self.sampled.get(msg, 0) + 1
+        self.samples.append((line, msg, values))
+        # returns True if the sample has been stored
+        return True
+
+    # add the statistics of the lines following the ones counted here
+    def merge(self, other):
+        for sample in other.errors:
+            # line numbers of the other statistics restart from 1
+            if not self.add_error((sample[0] + self.read,) + sample[1:]):
+                break
+        for line, msg, values in other.samples:
+            self.add_sample(line + self.read, msg, values)
+        self.read += other.read
+        self.correct += other.correct
+        self.mistakes += other.mistakes
+        self.approx_ok += other.approx_ok
+        self.approx_no += other.approx_no
+        self.discarded += other.discarded
+        if self.histograms is not None and other.histograms is not None:
+            self.histograms.merge(other.histograms)
+        return self
+
+    # add the statistics of several parts of the logs, in order
+    def merge_all(self, others):
+        for other in others:
+            self.merge(other)
+        return self
+
+    # counters and samples as a dictionary, to be saved as JSON
+    def to_dict(self):
+        state = {"read": self.read, "correct": self.correct, "mistakes": self.mistakes, "approx_ok": self.approx_ok,
+                 "approx_no": self.approx_no, "discarded": self.discarded, "errors": [list(s) for s in self.errors]}
+        if self.histograms is not None:
+            state["histograms"] = self.histograms.to_dict()
+        return state
+
+    # statistics saved with to_dict
+    @classmethod
+    def from_dict(cls, state, max_errors=-1):
+        stats = cls(max_errors)
+        for name in ("read", "correct", "mistakes", "approx_ok", "approx_no", "discarded"):
+            setattr(stats, name, state[name])
+        stats.errors = [tuple(s) for s in state["errors"]]
+        if "histograms" in state:
+            stats.histograms = ErrorHistograms.from_dict(state["histograms"])
+        return stats
+
+
+# histograms of the errors of the checked lines, in fixed buckets: their memory depends on the posit format only,
+# however many lines are counted, and the histograms of consecutive parts of the logs can be merged
+# lines are grouped by the sign, regime k and exponent of their expected result (results out of the range of the
+# format are counted with maxpos or minpos, zero and NaR have groups of their own); every group counts:
+#   the decisions on its lines
+#   code distances between output and expected output rounded to a posit, by bit length: 0, 1, 2-3, 4-7...
+#   relative errors |Out - expected| / |expected|, by binary exponent: [2^t, 2^(t+1)) for t in relative_range
+#   (smaller and larger errors are counted in the first and last bucket), plus zero and not finite errors
+class ErrorHistograms:
+    decisions = "veao"
+
+    def __init__(self, p_size, es_size, relative_range=relative_error_range):
+        # $relative_range: binary exponents of the first and last bucket of relative errors
+        self.p_size = p_size
+        self.es_size = es_size
+        self.relative_range = tuple(relative_range)
+        low, high = self.relative_range
+        # columns of a group: lines, decisions, code distances, relative errors (zero first, not finite last),
+        # largest code distance, sum of the finite relative errors
+        self.decision_columns = {msg: 1 + i for i, msg in enumerate(self.decisions)}
+        self.ulp_column = 1 + len(self.decisions)
+        self.relative_column = self.ulp_column + p_size + 1
+        self.max_column = self.relative_column + high - low + 3
+        self.width = self.max_column + 2
+        self.groups = {}  # (sign, k, exponent) -> columns; sign is "+", "-", "0" for zero or "NaR"
+
+    # group of an expected result
+    def group(self, expected):
+        if expected == 0:
+            return "0", 0, 0
+        if not isfinite(expected):
+            return "NaR", 0, 0
+        es_size = self.es_size
+        scale = min(max(frexp(abs(expected))[1] - 1, (2 - self.p_size) << es_size), (self.p_size - 2) << es_size)
+        # returns the key of the group
+        return "-" if expected < 0 else "+", scale >> es_size, scale & ((1 << es_size) - 1)
+
+    # column of a relative error
+    def relative_bucket(self, relative):
+        if relative == 0:
+            return self.relative_column
+        if not isfinite(relative):
+            return self.max_column - 1
+        low, high = self.relative_range
+        return self.relative_column + 1 + min(max(frexp(relative)[1] - 1, low), high) - low
+
+    # columns of a group, created empty on first use
+    def columns(self, key):
+        row = self.groups.get(key)
+        if row is None:
+            row = self.groups[key] = [0] * self.width
+        return row
+
+    # count a checked line
+    def add(self, expected, msg, distance, relative):
+        # $expected: the expected result, as a real number
+        # $distance: code distance between output and expected output
+        row = self.columns(self.group(expected))
+        row[0] += 1
+        row[self.decision_columns[msg]] += 1
+        row[self.ulp_column + distance.bit_length()] += 1
+        row[self.relative_bucket(relative)] += 1
+        if distance > row[self.max_column]:
+            row[self.max_column] = distance
+        if isfinite(relative):
+            row[self.max_column + 1] += relative
+
+    # count arrays of checked lines, as add does for each of them
+    def add_arrays(self, expected, decisions, distance, relative):
+        # $decisions: the index in ErrorHistograms.decisions of the decision of each line
+        if len(expected) == 0:
+            return
+        p_size, es_size, width = self.p_size, self.es_size, self.width
+        low, high = self.relative_range
+        lowest = (2 - p_size) << es_size
+        scale = np.clip(np.frexp(np.abs(expected))[1].astype(np.int64) - 1, lowest, (p_size - 2) << es_size)
+        # groups as integers: -2 for NaR, -1 for zero, then 2 for each scale (+1 if negative)
+        keys = np.where(expected == 0, -1,
+                        np.where(np.isfinite(expected), 2 * (scale - lowest) + (expected < 0), -2))
+        keys, inverse = np.unique(keys, return_inverse=True)
+        base = inverse * width
+        buckets = np.clip(np.frexp(relative)[1].astype(np.int64) - 1, low, high) - low + self.relative_column + 1
+        buckets = np.where(relative == 0, self.relative_column,
+                           np.where(np.isfinite(relative), buckets, self.max_column - 1))
+        counts = np.bincount(np.concatenate((base, base + 1 + decisions, base + self.ulp_column + bit_length(distance),
+                                             base + buckets)), minlength=len(keys) * width).reshape(len(keys), width)
+        largest = np.zeros(len(keys), dtype=np.uint64)
+        np.maximum.at(largest, inverse, distance)
+        sums = np.bincount(inverse, weights=np.where(np.isfinite(relative), relative, 0.0), minlength=len(keys))
+        for key, row, distance_max, total in zip(keys.tolist(), counts.tolist(), largest.tolist(), sums.tolist()):
+            if key < 0:
+                columns = self.columns((("NaR", 0, 0), ("0", 0, 0))[key + 2])
+            else:
+                scale = key // 2 + lowest
+                columns = self.columns(("-" if key & 1 else "+", scale >> es_size, scale & ((1 << es_size) - 1)))
+            for i in range(self.max_column):
+                columns[i] += row[i]
+            columns[self.max_column] = max(columns[self.max_column], distance_max)
+            columns[self.max_column + 1] += total
+
+    # add the counts of other histograms of the same format
+    def merge(self, other):
+        for key, row in other.groups.items():
+            columns = self.columns(key)
+            for i in range(self.max_column):
+                columns[i] += row[i]
+            columns[self.max_column] = max(columns[self.max_column], row[self.max_column])
+            columns[self.max_column + 1] += row[self.max_column + 1]
+        return self
+
+    # labels of the buckets of code distances and of relative errors
+    def bucket_labels(self):
+        low, high = self.relative_range
+        relative = ["0"] + ["2^" + str(t) for t in range(low, high + 1)] + ["not finite"]
+        # returns two lists of strings
+        return distance_labels(self.p_size), relative
+
+    # groups sorted by expected result, each one with its counts by name, and the counts of all the lines
+    def summary(self):
+        order = {"NaR": 0, "-": 1, "0": 2, "+": 3}
+        keys = sorted(self.groups, key=lambda key: (order[key[0]], (key[1], key[2]) if key[0] != "-"
+                                                    else (-key[1], -key[2])))
+        total = [0] * self.width
+        for row in self.groups.values():
+            for i in range(self.max_column):
+                total[i] += row[i]
+            total[self.max_column] = max(total[self.max_column], row[self.max_column])
+            total[self.max_column + 1] += row[self.max_column + 1]
+        groups = []
+        for key, row in [(key, self.groups[key]) for key in keys] + [(("all", None, None), total)]:
+            finite = row[0] - row[self.max_column - 1]
+            groups.append({"sign": key[0], "regime": key[1], "exponent": key[2], "lines": row[0],
+                           **{name: row[1 + i] for i, name in enumerate(("correct", "mistakes", "approx_ok",
+                                                                         "approx_no"))},
+                           "max_ulp": row[self.max_column],
+                           "mean_relative_error": row[self.max_column + 1] / finite if finite > 0 else None,
+                           "ulp": row[self.ulp_column:self.relative_column],
+                           "relative": row[self.relative_column:self.max_column]})
+        # returns the groups, the last one with all the lines
+        return groups
+
+    # save the histograms as JSON, or as CSV with a row per group, if the file name ends with .csv
+    def save(self, file_name, **info):
+        # $info: other fields of the JSON file (e.g. the operation)
+        ulp, relative = self.bucket_labels()
+        groups = self.summary()
+        with open(file_name, "w", newline="") as f:
+            if not file_name.endswith(".csv"):
+                json.dump({"N": self.p_size, "ES": self.es_size, **info, "ulp_buckets": ulp,
+                           "relative_buckets": relative, "groups": groups}, f, indent=1)
+                return
+            writer = csv.writer(f)
+            fields = [name for name in groups[0] if name not in ("ulp", "relative")]
+            writer.writerow(fields + ["ulp_" + label for label in ulp] + ["relative_" + label for label in relative])
+            for group in groups:
+                writer.writerow([group[name] for name in fields] + group["ulp"] + group["relative"])
+
+    # counts as a dictionary, to be saved as JSON
+    def to_dict(self):
+        return {"N": self.p_size, "ES": self.es_size, "relative_range": list(self.relative_range),
+                "groups": [list(key) + row for key, row in self.groups.items()]}
+
+    # histograms saved with to_dict
+    @classmethod
+    def from_dict(cls, state):
+        histograms = cls(state["N"], state["ES"], state["relative_range"])
+        for group in state["groups"]:
+            histograms.groups[tuple(group[:3])] = group[3:]
+        return histograms
+
+
+# counters of a differential run, comparing the logs of the design (DUT) with the logs of a golden model
+# lines are matched by their operands, so that the outputs of a log shifted by the latency of a pipeline, or with
+# 'x' lines the other log does not have, are still compared with the right ones; the outputs of matched lines are
+# compared by code distance, counted by bit length as in ErrorHistograms
+class DifferentialStats:
+    def __init__(self, p_size, tolerance=rounding_tolerance, max_samples=-1):
+        # $tolerance: code distance up to which different outputs are counted as approximations
+        # $max_samples: max samples of mismatching lines and of lines without a match to keep; -1 for infinite
+        self.p_size = p_size
+        self.tolerance = tolerance
+        self.max_samples = max_samples
+        # lines of the DUT logs and of the golden logs: read, discarded ('x' flag or invalid layout), without a match
+        self.read = 0
+        self.golden_read = 0
+        self.discarded = 0
+        self.golden_discarded = 0
+        self.unmatched = 0
+        self.golden_unmatched = 0
+        # matched lines: all of them, with the same output, with outputs up to tolerance codes apart
+        self.matched = 0
+        self.identical = 0
+        self.approximated = 0
+        self.distances = [0] * (p_size + 1)  # matched lines by bit length of the code distance of their outputs
+        self.max_distance = 0
+        self.max_pending = 0  # most lines waiting for their match at the same time, in a pair of logs
+        # samples of mismatching lines: (file, DUT line, golden line, operands..., DUT output, golden output, distance)
+        self.mismatches = []
+        # samples of lines without a match: (file, "DUT" or "golden", line, operands..., output)
+        self.orphans = []
+
+    # store a sample in a list of samples, if the limit of samples has not been reached yet
+    def add_sample(self, samples, sample):
+        if self.max_samples != -1 and len(samples) >= self.max_samples:
+            return False
+        samples.append(sample)
+        # returns True if the sample has been stored
+        return True
+
+    # count a matched line
+    def add(self, distance):
+        self.matched += 1
+        if distance == 0:
+            self.identical += 1
+        elif distance <= self.tolerance:
+            self.approximated += 1
+        self.distances[distance.bit_length()] += 1
+        if distance > self.max_distance:
+            self.max_distance = distance
+
+
+# time and calls of the stages of the validation, and lines taking each classification path
+class StageProfile:
+    def __init__(self):
+        self.calls = {}  # stage -> calls
+        self.seconds = {}  # stage -> cumulative time
+        self.paths = {}  # classification path -> lines
+
+    # add the time of a call of a stage
+    def add(self, stage, seconds, calls=1):
+        self.calls[stage] = self.calls.get(stage, 0) + calls
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+
+    # count lines taking a classification path
+    def count(self, path, lines=1):
+        self.paths[path] = self.paths.get(path, 0) + lines
+
+    # add the measures of another profile (e.g. of a worker process)
+    def merge(self, other):
+        for stage in other.calls:
+            self.add(stage, other.seconds[stage], other.calls[stage])
+        for path, lines in other.paths.items():
+            self.count(path, lines)
+        return self
+
+    # measures as a dictionary, to be saved as JSON
+    def to_dict(self):
+        return {"stages": {stage: {"calls": self.calls[stage], "seconds": self.seconds[stage]} for stage in self.calls},
+                "paths": dict(self.paths)}
+
+
+# bounded cache of computed results, discarding the least recently used one when full
+class MemoCache:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    # the value stored for a key, or None if it is not in the cache
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    # store the value of a key (values must not be None)
+    def put(self, key, value):
+        self.entries[key] = value
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    # drop the entries, keeping the counters
+    def clear(self):
+        self.entries.clear()
+
+    # add the counters of another cache (e.g. of a worker process)
+    def merge(self, other):
+        self.hits += other.hits
+        self.misses += other.misses
+        return self
+
+
+# structured output of checked lines, written to a JSONL or CSV file (chosen by its extension)
+class ResultSink:
+    def __init__(self, file_name, buffer_bytes=1 << 20, operands=("A", "B", "C"), offset=None):
+        # $operands: names of the operands of the operation
+        # $offset: bytes of the file to keep, when a run resumes writing it (see ResultSink.flush); None to rewrite it
+        variables = list(operands) + ["Out"]
+        # line is counted from the first log of the run, as in the error samples; file_line from the first line of file
+        self.fields = (["line", "file", "file_line", "decision"] + variables + [name + "_value" for name in variables]
+                       + ["error"])
+        self.file_name = file_name
+        self.file = open(file_name, "w" if offset is None else "a", newline="", buffering=buffer_bytes)
+        if offset is not None:
+            # rows written after the checkpoint the run resumes from are written again
+            self.file.truncate(offset)
+        self.writer = None
+        if file_name.endswith(".csv"):
+            self.writer = csv.writer(self.file)
+            if offset is None:
+                self.writer.writerow(self.fields)
+        self.written = {}  # decision -> lines written
+
+    # write samples (line, decision, values or None) of a log, in the given order
+    def write(self, samples, file=None, first_line=0):
+        # $file: name of the log of the samples
+        # $first_line: lines of the run before the first line of the log
+        for line, msg, values in samples:
+            row = ([line, file, line - first_line, msg]
+                   + (list(values) if values is not None else [None] * (len(self.fields) - 4)))
+            if self.writer is not None:
+                self.writer.writerow(row)
+            else:
+                self.file.write(json.dumps(dict(zip(self.fields, row))) + "\n")
+            self.written[msg] = self.written.get(msg, 0) + 1
+
+    # write the rows buffered so far to the file
+    def flush(self):
+        self.file.flush()
+        # returns the size of the file, in bytes
+        return self.file.buffer.tell()
+
+    def close(self):
+        self.file.close()
+
+
+# state of a log followed while it is written
+class FollowedLog:
+    def __init__(self, name, max_lines=-1, stats=None):
+        self.name = name
+        self.offset = 0  # bytes read
+        self.partial = b""  # last line read, until its terminator is written
+        self.last_line = None  # last complete line, to find the lines of different length
+        self.lines_left = max_lines
+        self.stats = stats if stats is not None else ValidationStats()
+        self.stop = None  # why the log has ended (its limit of lines), None while it is followed
 
 
 # ---------------------------------------------------------------
 # ------------------------- FUNCTIONS ---------------------------
+# hash of the content of a file, read a block at a time from the mapped file
+def file_digest(file_name, block_bytes=hash_block_bytes):
+    digest = hashlib.blake2b(digest_size=32)
+    size = getsize(file_name)
+    if size > 0:
+        with open(file_name, "rb") as f, mmap(f.fileno(), 0, access=ACCESS_READ) as data:
+            view = memoryview(data)
+            for start in range(0, size, block_bytes):
+                digest.update(view[start:start + block_bytes])
+            view.release()
+    # returns the digest as a hexadecimal string
+    return digest.hexdigest()
+
+
+# labels of the buckets of code distances by bit length: 0, 1, 2-3, 4-7... up to the distances of a posit format
+def distance_labels(p_size):
+    # returns a list of strings
+    return ["0", "1"] + [str(1 << (i - 1)) + "-" + str((1 << i) - 1) for i in range(2, p_size + 1)]
+
 
 # LOG file should be written with rows like: "'i' $input 'o' $output"
 def extract_raw_input(raw_input):
@@ -56,26 +636,6 @@ def extract_raw_input(raw_input):
     return chunks[1], chunks[3][1:], chunks[3][0]
 
 
-# input array is {A,B,C}
-# output array has already been trimmed to remove the flag that was in head
-# A,B,C,Out can be binary strings or hex strings
-# returned values  must be binary strings
-def split_variables(in_raw, out_raw):
-    if input_type == "hex":
-        a = hex2bit(in_raw[:A_h_len], A_binary_len)
-        b = hex2bit(in_raw[A_h_len:A_h_len + B_h_len], B_binary_len)
-        c = hex2bit(in_raw[A_h_len + B_h_len:], C_binary_len)
-    else:
-        a = in_raw[:A_binary_len]
-        b = in_raw[A_binary_len:A_binary_len + B_binary_len]
-        c = in_raw[A_binary_len + B_binary_len:]
-    if output_type == "hex":
-        o = hex2bit(out_raw, Out_binary_len)
-    else:
-        o = out_raw
-    return a, b, c, o
-
-
 # expected operation is A+B*C; the result is compared with the output saved in the log
 def expected_output(a, b, c):
     return a + b * c
@@ -103,177 +663,1645 @@ def verbose_msg(msg):
     return "\n"
 
 
-# read the log file line by line, and produce a validation report
-def validate_log(input_file, max_lines=-1):
-    # validation counters are initialized to zero
-    global Correct
-    global Read
-    global Mistakes
-    global Approx_ok
-    global Approx_no
-    global Discarded
-    global verbose
-    global last_msg
-    global errors_displayed
-    global last_line_read
+# count a decision in the statistics
+def count_decision(stats, msg):
+    if msg == "v":
+        stats.correct += 1
+    elif msg == "a":
+        stats.approx_ok += 1
+    elif msg == "o":
+        stats.approx_no += 1
+    elif msg == "e":
+        stats.mistakes += 1
+
+
+# find the line that ends right before a byte offset of a binary file
+def previous_line(f, offset):
+    data = b""
+    pos = offset - 1  # skip the newline of the previous line
+    while pos > 0 and b"\n" not in data:
+        size = min(4096, pos)
+        pos -= size
+        f.seek(pos)
+        data = f.read(size) + data
+    return data[data.rfind(b"\n") + 1:].decode(errors="replace").rstrip()
+
+
+# open a log, decompressing it if its name ends with one of compressed_extensions
+def open_log(file_name, mode="r"):
+    # $mode: "r" to read text, "rb" to read bytes
+    if file_name.endswith(".gz"):
+        return gzip.open(file_name, "rb" if mode == "rb" else "rt")
+    if file_name.endswith(".zst"):
+        if zstandard is None:
+            raise ImportError("zstandard is required to read " + file_name)
+        return zstandard.open(file_name, "rb" if mode == "rb" else "rt")
+    return open(file_name, mode)
+
+
+# lines of a binary file, read by two background threads connected by bounded queues:
+# the reader prefetches (and decompresses) blocks of bytes, the splitter cuts them in lines
+# lines are yielded in order with their terminator, as iterating the file would do
+def pipelined_lines(f, block_bytes, depth, limit=-1):
+    # $f: binary file, read from its current position
+    # $block_bytes: bytes read at a time
+    # $depth: max items waiting in each queue
+    # $limit: max bytes to read; -1 to read until the end of the file
+    blocks = Queue(depth)
+    batches = Queue(depth)
+    finished = object()
+    done = Event()  # set when the lines are no longer needed
+
+    # put an item in a queue, unless the lines are no longer needed
+    def put(queue, item):
+        while not done.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                pass
+        return False
+
+    # take an item from a queue; None if the lines are no longer needed
+    def take(queue):
+        while not done.is_set():
+            try:
+                return queue.get(timeout=0.1)
+            except Empty:
+                pass
+        return None
+
+    def read():
+        left = limit
+        try:
+            while left != 0:
+                block = f.read(block_bytes if left < 0 else min(block_bytes, left))
+                if not block:
+                    break
+                if left > 0:
+                    left -= len(block)
+                if not put(blocks, block):
+                    return
+        except Exception as error:
+            # errors are raised again where the lines are used
+            put(blocks, error)
+            return
+        put(blocks, finished)
+
+    def split():
+        partial = b""
+        while True:
+            block = take(blocks)
+            if block is None:
+                return
+            if block is finished or isinstance(block, Exception):
+                # the last line might have no terminator
+                if partial and block is finished:
+                    put(batches, [partial])
+                put(batches, block)
+                return
+            data = partial + block
+            end = data.rfind(b"\n") + 1
+            partial = data[end:]
+            lines = data[:end].split(b"\n")
+            lines.pop()
+            if lines and not put(batches, [line + b"\n" for line in lines]):
+                return
+
+    threads = [Thread(target=read, daemon=True), Thread(target=split, daemon=True)]
+    for thread in threads:
+        thread.start()
+    try:
+        while True:
+            batch = batches.get()
+            if batch is finished:
+                return
+            if isinstance(batch, Exception):
+                raise batch
+            yield from batch
+    finally:
+        # the threads are stopped before the file is closed
+        done.set()
+        for thread in threads:
+            thread.join()
+
+
+# validate the lines in a byte range of a log; this is the task run by the worker processes
+def validate_shard(task):
+    # $task: (configuration, file name, first byte, end byte, max lines)
+    config, input_file, start, end, max_lines = task
+    return LogValidator(config).scan_shard(input_file, start, end, max_lines)
+
+
+# ---------------------------------------------------------------
+# ------------------------- VALIDATOR ---------------------------
+# validation of FMA logs with a given configuration
+# the last line read is kept between calls, since a log might continue in the next file
+class LogValidator:
+    def __init__(self, config=None):
+        self.config = config if config is not None else ValidatorConfig()
+        self.operation = get_operation(self.config.operation)
+        # expected input size (A on 2N bits, B and C on N bits for the FMA):
+        self.operand_binary_lens = [width * self.config.N for width in self.operation.widths]
+        self.Out_binary_len = self.config.N
+        # expected hex size:
+        self.operand_h_lens = [int(length / 4) for length in self.operand_binary_lens]
+        self.Out_h_len = int(self.Out_binary_len / 4)
+        self.In_binary_len = sum(self.operand_binary_lens)
+        self.In_h_len = sum(self.operand_h_lens)
+        # bits of each variable of a line, output included
+        self.variable_binary_lens = self.operand_binary_lens + [self.Out_binary_len]
+        self.variable_bases = [2] * len(self.variable_binary_lens)
+        # functions cutting the input in its operands; the last operand takes the rest of the input
+        self.split_binary_input = self.input_splitter(self.operand_binary_lens)
+        self.split_h_input = self.input_splitter(self.operand_h_lens)
+        self.last_line_read = None
+        # checkpoint state: files completed, and [file, byte offset, lines read] of the file being read
+        self.files_done = []
+        self.position = None
+        self.last_checkpoint = monotonic()
+        self.last_progress = monotonic()
+        # file where samples of the checked lines are written, opened when the first ones are ready
+        self.sink = None
+        # log whose lines are being checked, and lines of the run before its first line, for the rows of the sink
+        self.source = (None, 0)
+        # measures of the stages, None unless profiling is enabled
+        self.profile = StageProfile() if self.config.profile else None
+        # logs whose result has been taken from the result cache, and logs validated and stored in it
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # caches of the values of the formats decoded without lookup table, and of the decisions on the lines
+        # (keyed on the codes of the operands and of Out); None unless memo_size is positive
+        self.decode_memo = MemoCache(self.config.memo_size) if self.config.memo_size > 0 else None
+        self.classify_memo = MemoCache(self.config.memo_size) if self.config.memo_size > 0 else None
+
+    # empty statistics, keeping as many error samples (and samples for the sink) as configured
+    def new_stats(self):
+        c = self.config
+        return ValidationStats(c.limit_errors_to_display, c.sink_limits if c.sink_file is not None else None,
+                               ErrorHistograms(c.N, c.ES, c.relative_error_range) if c.histograms else None)
+
+    # progress message, at most once every progress_interval seconds
+    def progress(self, stats):
+        now = monotonic()
+        if now - self.last_progress >= self.config.progress_interval:
+            self.last_progress = now
+            self.message("Reached line ", stats.read)
+
+    # write the samples of checked lines taken so far to the sink, and remove them from the statistics
+    def write_samples(self, stats):
+        if not stats.samples:
+            return
+        if self.sink is None:
+            self.open_sink()
+        self.sink.write(stats.samples, *self.source)
+        stats.samples.clear()
+
+    # open the sink; a resumed run keeps the rows written up to its checkpoint
+    def open_sink(self, offset=None, written=None):
+        # $offset: bytes of the sink written up to the checkpoint; None to rewrite the sink
+        # $written: lines written up to the checkpoint, by decision
+        self.sink = ResultSink(self.config.sink_file, operands=self.operation.operands, offset=offset)
+        if written is not None:
+            self.sink.written = dict(written)
+
+    # flush and close the sink; it is created, if no sample has been written
+    def close_sink(self):
+        if self.config.sink_file is None:
+            return
+        if self.sink is None:
+            self.open_sink()
+        self.sink.close()
+
+    # console output, unless the validator is quiet
+    def message(self, *args):
+        if not self.config.quiet:
+            print(*args)
+
+    # lines of a log opened in binary mode, from its current position; they are read ahead if the pipeline is enabled
+    def log_lines(self, f, limit=-1):
+        # $limit: max bytes to read; -1 to read until the end of the file
+        if self.config.pipeline:
+            yield from pipelined_lines(f, self.config.pipeline_block_bytes, self.config.pipeline_depth, limit)
+        elif limit < 0:
+            yield from f
+        else:
+            while limit > 0:
+                line = f.readline()
+                if not line:
+                    break
+                limit -= len(line)
+                yield line
+
     # the smallest number that can be represented with the number of bits of the output
     # a number smaller than this is considered not representable
-    sensitivity = posit2real('1'.zfill(N))
-    print("Starting: scan ", input_file)
-    with open(path + "/" + input_file, "r") as f:
-        # declare variables to keep the in scope
-        a_b = 0
-        b_b = 0
-        c_b = 0
-        out_b = 0
-        a_f = 0
-        b_f = 0
-        c_f = 0
-        out_f = 0
-        e = 0
-        for line in f:
+    def output_sensitivity(self):
+        return posit2real('1'.zfill(self.config.N))
+
+    # real value of a code, from the lookup tables or, for wider formats, from the cache of decoded values
+    def decode(self, code, p_size):
+        es_size = self.config.ES
+        memo = self.decode_memo
+        if memo is None or p_size <= max_table_bits:
+            return lookup_posit(code, p_size, es_size)
+        value = memo.get((p_size, es_size, code))
+        if value is None:
+            value = decode_posit(code, p_size, es_size)
+            memo.put((p_size, es_size, code), value)
+        # returns the real signed number
+        return value
+
+    # function cutting an input in operands of some lengths, the last one up to the end of the input
+    @staticmethod
+    def input_splitter(lengths):
+        bounds = [sum(lengths[:i]) for i in range(len(lengths))] + [None]
+        parts = [slice(start, end) for start, end in zip(bounds[:-1], bounds[1:])]
+        if len(parts) == 1:
+            return lambda raw: (raw[parts[0]],)
+        # returns a function of the input, returning a tuple of strings
+        return itemgetter(*parts)
+
+    # input array is {A,B,C} (the operands of the operation)
+    # output array has already been trimmed to remove the flag that was in head
+    # A,B,C,Out can be binary strings or hex strings
+    # returned values  must be binary strings
+    def split_variables(self, in_raw, out_raw):
+        if self.config.input_type == "hex":
+            variables = list(map(hex2bit, self.split_h_input(in_raw), self.operand_binary_lens))
+        else:
+            variables = list(self.split_binary_input(in_raw))
+        if self.config.output_type == "hex":
+            variables.append(hex2bit(out_raw, self.Out_binary_len))
+        else:
+            variables.append(out_raw)
+        # returns a list with the operands and the output
+        return variables
+
+    # decide if the output of a line is correct, knowing the operands and the output as real numbers
+    # the code of the output is needed to find its neighbours in the rounding interval
+    def classify(self, values, out_f, o, sensitivity):
+        # $values: the operands as real numbers
+        p_size, es_size, tolerance = self.config.N, self.config.ES, self.config.rounding_tolerance
+        profile = self.profile
+        # compare output and expected output
+        expected = self.operation.value(*values)
+        e = out_f - expected
+        negligible = abs(e) < sensitivity
+        if e == 0:
+            # the output can be represented and it is correct
+            if profile is not None:
+                profile.count("exact")
+            return "v", e
+        if negligible:
+            # the output cannot be represented, so the error is due to rounding
+            if profile is not None:
+                profile.count("negligible")
+            return "a", e
+        if profile is not None:
+            start = perf_counter()
+        # output might be not representable
+        o_lb, o_ub = posit_neighbours(o, tolerance, p_size)
+        o_lb_f = lookup_posit(o_lb, p_size, es_size)
+        o_ub_f = lookup_posit(o_ub, p_size, es_size)
+
+        e_low = o_lb_f - expected
+        e_upp = o_ub_f - expected
+        if profile is not None:
+            profile.add("rounding window", perf_counter() - start)
+
+        # if the correct result is between two consecutive posit, then
+        # the error for them should have different sign
+        if sign(e) != sign(e_low) or sign(e) != sign(e_upp):
+            if profile is not None:
+                profile.count("rounding window")
+            return "a", e  # up or down rounding has happened
+        # error is beyond approximation threshold
+        if profile is not None:
+            start = perf_counter()
+        representable = isRepresentable(expected, p_size, es_size)
+        if profile is not None:
+            profile.add("isRepresentable", perf_counter() - start)
+            profile.count("mistake" if representable else "not representable")
+        if representable:
+            return "e", e
+        return "o", e
+
+    # decide if the output of a line is correct, comparing its code with the exact result rounded to a posit
+    def classify_exact(self, codes, o):
+        # $codes: the codes of the operands
+        p_size = self.config.N
+        expected, exact = self.operation.exact(codes, p_size, self.config.ES)
+        if exact:
+            # the expected output is representable: the output must be the same
+            msg = "v" if expected == o else "e"
+        # the expected output is rounded: accept outputs up to rounding_tolerance codes away
+        elif code_distance(expected, o, p_size) <= self.config.rounding_tolerance:
+            msg = "a"
+        else:
+            msg = "o"
+        if self.profile is not None:
+            self.profile.count({"v": "exact", "e": "mistake", "a": "within tolerance", "o": "beyond tolerance"}[msg])
+        return msg
+
+    # check a single line of the log, updating the statistics
+    def check_line(self, raw_input, stats, sensitivity):
+        profile = self.profile
+        if profile is not None:
+            start = perf_counter()
+        last_msg = "x"
+        # get input/output arrays, plus a flag
+        in_vector, out_vector, flag = extract_raw_input(raw_input)
+
+        # check correct size of input string
+        if self.config.input_type == "hex":
+            if len(in_vector) != self.In_h_len:
+                if self.config.verbose:
+                    self.message("Invalid input arguments for line ", stats.read)
+                stats.discarded += 1
+                stats.read += 1
+        else:
+            if len(in_vector) != self.In_binary_len:
+                if self.config.verbose:
+                    self.message("Invalid input arguments for line ", stats.read)
+                stats.discarded += 1
+                stats.read += 1
+        # check correct size of output string
+        if self.config.input_type == "hex":
+            if len(out_vector) != self.Out_h_len:
+                if self.config.verbose:
+                    self.message("Invalid output arguments for line ", stats.read)
+                stats.discarded += 1
+                stats.read += 1
+        else:
+            if len(out_vector) != self.Out_binary_len:
+                if self.config.verbose:
+                    self.message("Invalid output arguments for line ", stats.read)
+                stats.discarded += 1
+                stats.read += 1
+        # if the network was not ready to produce the output yet (usually the very first clock posedge)
+        if flag == 'x':
+            if self.config.verbose:
+                self.message("Invalid line ", stats.read)
+            stats.discarded += 1
+            stats.read += 1
+            if profile is not None:
+                profile.add("parse", perf_counter() - start)
+                profile.count("discarded")
+            # returns the decision, and the values to display (None for discarded lines)
+            return last_msg, None
+
+        # cut the arrays into variables
+        variables = self.split_variables(in_vector, out_vector)
+        if profile is not None:
+            profile.add("parse", perf_counter() - start)
+        return self.check_values(variables, stats, sensitivity)
+
+    # check the variables of a line, as binary strings, updating the statistics
+    def check_values(self, variables, stats, sensitivity):
+        # $variables: the operands and the output, as binary strings
+        profile = self.profile
+        if profile is not None:
+            start = perf_counter()
+        # convert binary variables to real variables
+        codes = tuple(map(int, variables, self.variable_bases))
+        memo = self.classify_memo
+        cached = memo.get(codes) if memo is not None else None
+        if cached is not None:
+            # the same codes have already been checked: the decision and the values are the same
+            last_msg, e = cached[0], cached[1]
+            values = cached[2:]
+            if profile is not None:
+                profile.add("memo", perf_counter() - start)
+                profile.count("cached")
+        else:
+            values = tuple(map(self.decode, codes, self.variable_binary_lens))
+            if profile is not None:
+                now = perf_counter()
+                profile.add("decode", now - start)
+                start = now
+
+            if self.config.exact_reference:
+                last_msg = self.classify_exact(codes[:-1], codes[-1])
+                e = values[-1] - self.operation.value(*values[:-1])
+            else:
+                last_msg, e = self.classify(values[:-1], values[-1], codes[-1], sensitivity)
+            if profile is not None:
+                profile.add("classify", perf_counter() - start)
+            if memo is not None:
+                memo.put(codes, (last_msg, e) + values)
+        stats.read += 1
+        count_decision(stats, last_msg)
+        if stats.histograms is not None:
+            self.count_errors(stats.histograms, codes, values, last_msg)
+        # returns the decision, and the values to display: the variables as binary strings, then as real numbers,
+        # then the error
+        return last_msg, (*variables, *values, e)
+
+    # count the error of a checked line in the histograms
+    def count_errors(self, histograms, codes, values, msg):
+        # $codes, $values: the codes and the real values of the operands and of the output
+        p_size, es_size = self.config.N, self.config.ES
+        if self.profile is not None:
+            start = perf_counter()
+        expected = self.operation.value(*values[:-1])
+        # the expected output, rounded to a posit as the reference of the check does
+        if self.config.exact_reference:
+            code = self.operation.exact(codes[:-1], p_size, es_size)[0]
+        else:
+            code = encode_posit(expected, p_size, es_size)
+        error = abs(values[-1] - expected)
+        if expected != 0:
+            relative = error / abs(expected)
+        else:
+            relative = 0.0 if error == 0 else inf
+        histograms.add(expected, msg, code_distance(code, codes[-1], p_size), relative)
+        if self.profile is not None:
+            self.profile.add("histograms", perf_counter() - start)
+
+    # fancy console output of a line
+    def print_line(self, line, msg, values):
+        self.message("Line: ", str(line))
+        if msg != "x":
+            names = self.operation.operands + ("Out",)
+            count = len(names)
+            for name, bits, value in zip(names, values[:count], values[count:2 * count]):
+                self.message(name + ": ", bits, " -> ", value)
+            self.message(values[2 * count - 1], " = ", *self.operation.terms(*values[count:2 * count - 1]),
+                         " + error")
+            self.message("Error: " + str(values[-1]))
+        self.message("Decision: ", verbose_msg(msg))
+
+    # fancy console output of a line whose output differs from the one of the golden model
+    def print_mismatch(self, sample):
+        # $sample: (file, DUT line, golden line, operands..., DUT output, golden output, distance), as binary strings
+        self.message("Line: ", sample[1], " of ", sample[0], " (golden line ", sample[2], ")")
+        for name, bits in zip(self.operation.operands + ("Out", "Golden"), sample[3:-1]):
+            self.message(name + ": ", bits, " -> ", self.decode(int(bits, 2), len(bits)))
+        self.message("Code distance: ", sample[-1], "\n")
+
+    # convert a chunk of lines in arrays of codes, if all of them are written as "i $input o $flag$output"
+    def parse_chunk(self, lines):
+        sizes = digit_sizes(self.config.N, self.config.input_type, self.operation.widths)
+        width = sum(sizes[:-1]) + 6
+        # the fast path needs the sizes that check_line would accept, and a single digit encoding
+        if self.config.input_type != self.config.output_type or any(len(line) != width for line in lines):
+            return None
+        if self.profile is not None:
+            start = perf_counter()
+        buf = np.frombuffer("".join(lines).encode("ascii", "replace"), dtype=np.uint8).reshape(len(lines), width)
+        valid, flags, *codes = parse_records(buf, *sizes)
+        if self.profile is not None:
+            self.profile.add("parse (NumPy)", perf_counter() - start)
+        if not np.all(valid):
+            return None
+        # returns the flags (as ASCII codes), and the codes of the operands and of Out
+        return flags, codes
+
+    # check a chunk of lines with NumPy; only the lines failing the exact check are handled one by one
+    def validate_chunk(self, lines, sensitivity):
+        parsed = self.parse_chunk(lines)
+        if parsed is None:
+            # some line does not have the expected layout: use the same checks of the line by line mode
+            stats = self.new_stats()
+            for raw_input in lines:
+                msg, values = self.check_line(raw_input, stats, sensitivity)
+                if msg == "e":
+                    stats.add_error((stats.read,) + values)
+                if stats.sample_limits:
+                    stats.add_sample(stats.read, msg, values)
+            return stats
+        return self.validate_codes(*parsed, sensitivity)
+
+    # check arrays of flags and codes with NumPy; only the lines failing the exact check are handled one by one
+    # with exact_reference, the expected codes of all the lines are computed at once by the operation
+    def validate_codes(self, flags, codes, sensitivity):
+        # $codes: arrays with the codes of the operands and of Out
+        p_size, es_size = self.config.N, self.config.ES
+        profile = self.profile
+        if profile is not None:
+            start = perf_counter()
+        stats = self.new_stats()
+        rows = np.flatnonzero(flags != ord("x"))
+        codes = [column[rows] for column in codes]
+        values = [decode_posits(column, length, es_size) for column, length in zip(codes, self.variable_binary_lens)]
+        expected_values = self.operation.value(*values[:-1])
+        e = values[-1] - expected_values
+        stats.read = len(flags)
+        stats.discarded = len(flags) - len(rows)
+        if profile is not None:
+            now = perf_counter()
+            profile.add("decode (NumPy)", now - start)
+            profile.count("discarded", stats.discarded)
+            start = now
+
+        # values of the i-th line not discarded, as check_values returns them
+        def line_values(i, err):
+            return (tuple(format(int(column[i]), "0" + str(length) + "b")
+                          for column, length in zip(codes, self.variable_binary_lens))
+                    + tuple(float(column[i]) for column in values) + (err,))
+
+        # lines decided with NumPy, by decision
+        decided = {}
+        if self.config.exact_reference and self.operation.exact_codes is None:
+            # every line is compared with the exact result, one at a time
+            slow = range(len(rows))
+        elif self.config.exact_reference:
+            expected, exact = self.operation.exact_codes(codes[:-1], p_size, es_size)
+            distance = code_distances(expected, codes[-1], p_size)
+            within = distance <= self.config.rounding_tolerance
+            decided = {"v": exact & (expected == codes[-1]), "e": exact & (expected != codes[-1]),
+                       "a": ~exact & within, "o": ~exact & ~within}
+            stats.correct, stats.mistakes, stats.approx_ok, stats.approx_no = (
+                int(np.count_nonzero(decided[msg])) for msg in "veao")
+            mistakes = np.flatnonzero(decided["e"])
+            if stats.max_errors >= 0:
+                mistakes = mistakes[:stats.max_errors]
+            for i in mistakes.tolist():
+                stats.add_error((int(rows[i]) + 1,) + line_values(i, float(e[i])))
+            slow = []
+            if profile is not None:
+                profile.add("classify (NumPy)", perf_counter() - start)
+                for msg, path in (("v", "exact"), ("e", "mistake"), ("a", "within tolerance"),
+                                  ("o", "beyond tolerance")):
+                    profile.count(path, int(np.count_nonzero(decided[msg])))
+        else:
+            exact = e == 0
+            negligible = ~exact & (np.abs(e) < sensitivity)
+            decided = {"v": exact, "a": negligible}
+            stats.correct = int(np.count_nonzero(exact))
+            stats.approx_ok = int(np.count_nonzero(negligible))
+            slow = np.flatnonzero(~exact & ~negligible).tolist()
+            if profile is not None:
+                profile.add("classify (NumPy)", perf_counter() - start)
+                profile.count("exact", stats.correct)
+                profile.count("negligible", stats.approx_ok)
+        # samples of the chunk for the sink, taken before the limits of the decisions are applied
+        candidates = []
+        # decisions of the lines checked one by one, for the histograms
+        slow_msgs = [] if stats.histograms is not None else None
+        # rounding interval check, in line order; the values and codes of the lines are fetched all at once
+        memo = self.classify_memo
+        slow_values = list(zip(*[column[slow].tolist() for column in values])) if len(slow) else []
+        slow_codes = list(zip(*[column[slow].tolist() for column in codes])) if len(slow) else []
+        for i, line, key in zip(slow, slow_values, slow_codes):
+            if profile is not None:
+                start = perf_counter()
+            cached = memo.get(key) if memo is not None else None
+            if cached is not None:
+                msg, err = cached[0], cached[1]
+                if profile is not None:
+                    profile.count("cached")
+            else:
+                if self.config.exact_reference:
+                    msg, err = self.classify_exact(key[:-1], key[-1]), float(e[i])
+                else:
+                    msg, err = self.classify(line[:-1], line[-1], key[-1], sensitivity)
+                if memo is not None:
+                    memo.put(key, (msg, err) + line)
+            if profile is not None:
+                profile.add("classify", perf_counter() - start)
+            count_decision(stats, msg)
+            if slow_msgs is not None:
+                slow_msgs.append(msg)
+            if msg == "e":
+                stats.add_error((int(rows[i]) + 1,) + line_values(i, err))
+            if stats.wants_samples(msg):
+                candidates.append((int(rows[i]) + 1, msg, line_values(i, err)))
+        if stats.sample_limits:
+            # lines decided with NumPy: the first ones of each decision are enough
+            picks = [("x", np.flatnonzero(flags == ord("x")), None)]
+            picks += [(msg, np.flatnonzero(lines), rows) for msg, lines in decided.items()]
+            for msg, picked, index in picks:
+                limit = stats.sample_limits.get(msg, 0)
+                for i in (picked if limit < 0 else picked[:limit]).tolist():
+                    if index is None:
+                        candidates.append((i + 1, msg, None))
+                    else:
+                        candidates.append((int(index[i]) + 1, msg, line_values(i, float(e[i]))))
+            # limits are applied in line order, as in the line by line mode
+            for sample in sorted(candidates, key=lambda sample: sample[0]):
+                stats.add_sample(*sample)
+        if stats.histograms is not None:
+            if profile is not None:
+                start = perf_counter()
+            decisions = np.zeros(len(rows), dtype=np.int64)
+            for msg, lines in decided.items():
+                decisions[lines] = ErrorHistograms.decisions.index(msg)
+            decisions[slow] = [ErrorHistograms.decisions.index(msg) for msg in slow_msgs]
+            # the expected outputs, rounded to posits as the reference of the check does
+            if not self.config.exact_reference:
+                expected = encode_posits(expected_values, p_size, es_size)
+            elif self.operation.exact_codes is None:
+                expected = np.array([self.operation.exact(key, p_size, es_size)[0]
+                                     for key in zip(*[column.tolist() for column in codes[:-1]])], dtype=np.uint64)
+            error = np.abs(e)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                relative = np.where(expected_values != 0, error / np.abs(expected_values),
+                                    np.where(error == 0, 0.0, np.inf))
+            stats.histograms.add_arrays(expected_values, decisions, code_distances(expected, codes[-1], p_size),
+                                        relative)
+            if profile is not None:
+                profile.add("histograms (NumPy)", perf_counter() - start)
+        # returns the statistics of the chunk, with line numbers starting from 1
+        return stats
+
+    # add the statistics of a chunk to the ones of the run, showing the new error samples
+    def merge_chunk(self, stats, chunk_stats, display=True):
+        shown = len(stats.errors)
+        stats.merge(chunk_stats)
+        if not display:
+            return
+        for sample in stats.errors[shown:]:
+            self.print_line(sample[0], "e", sample[1:])
+        self.write_samples(stats)
+        if self.config.show_progress:
+            self.progress(stats)
+
+    # check the lines of a log, until they end or the log is considered finished
+    # returns the reason why the scan stopped (None if all lines were read) and the last line read
+    def scan_lines(self, lines, stats, sensitivity, last_line=None, max_lines=-1, display=True, follow=False):
+        # $lines: iterable of lines of the log
+        # $stats: statistics to be updated
+        # $last_line: the line read before the first one of $lines, if any
+        # $display: output progress and error samples in console while reading
+        # $follow: the log is still being written (follow mode): a repeated line is checked as any other, and a line
+        #          of different length is discarded, instead of ending the log
+        batch = self.config.batch_size
+        use_batch = batch > 0 and not self.config.verbose
+        if use_batch and np is None:
+            if display:
+                self.message("NumPy not available: batch mode disabled")
+            use_batch = False
+        chunk = []
+        stop = None
+        for line in lines:
             # avoid to read the whole file, that might be huge
             raw_input = line.rstrip()
-            if last_line_read == raw_input:
-                print("End of file reached")
+            if last_line == raw_input and not follow:
+                stop = "End of file reached"
                 break
             # last line of the file might be incomplete
-            if Read > 0:
-                if len(last_line_read) != len(raw_input):
-                    print("Incomplete line trimmed out")
+            if last_line is not None and len(last_line) != len(raw_input):
+                if not follow:
+                    stop = "Incomplete line trimmed out"
                     break
-            last_line_read = raw_input
+                # incomplete lines are kept until they are complete: this one does not follow the layout
+                if chunk:
+                    self.merge_chunk(stats, self.validate_chunk(chunk, sensitivity), display)
+                    chunk = []
+                stats.read += 1
+                stats.discarded += 1
+                if stats.sample_limits:
+                    stats.add_sample(stats.read, "x", None)
+                if display and self.config.verbose:
+                    self.print_line(stats.read, "x", None)
+                continue
+            last_line = raw_input
             if max_lines == 0:
-                print("Enforced shut down: reached limit of max lines for this file")
+                stop = "Enforced shut down: reached limit of max lines for this file"
                 break
             if max_lines > 0:
                 max_lines -= 1
 
-            # get input/output arrays, plus a flag
+            if use_batch:
+                chunk.append(raw_input)
+                if len(chunk) == batch:
+                    self.merge_chunk(stats, self.validate_chunk(chunk, sensitivity), display)
+                    chunk = []
+                    self.tick(stats, last_line)
+                continue
+
+            last_msg, values = self.check_line(raw_input, stats, sensitivity)
+            sampled = last_msg == "e" and stats.add_error((stats.read,) + values)
+            if stats.sample_limits:
+                stats.add_sample(stats.read, last_msg, values)
+                if display and len(stats.samples) >= 1000:
+                    self.write_samples(stats)
+            # the clock is read every 100 lines
+            if display and self.config.show_progress and stats.read % 100 == 0:
+                self.progress(stats)
+            if display and (self.config.verbose or sampled):
+                self.print_line(stats.read, last_msg, values)
+            if self.position is not None:
+                self.tick(stats, last_line)
+        if chunk:
+            self.merge_chunk(stats, self.validate_chunk(chunk, sensitivity), display)
+        if display:
+            self.write_samples(stats)
+        return stop, last_line
+
+    # check fixed size records a chunk at a time, until a record equal to the one before it marks the end of the log
+    def scan_blocks(self, records, check, stats, sensitivity):
+        # $records: array with one record per element (packed logs) or per row (mapped text logs)
+        # $check: function returning the statistics of a chunk of records
+        chunk = self.config.batch_size if self.config.batch_size > 0 else 1 << 20
+        for start in range(0, len(records), chunk):
+            # the record before the chunk is needed to find a repeated record at its first line
+            first = max(start - 1, 0)
+            block = np.asarray(records[first:start + chunk])
+            same = block[1:] == block[:-1]
+            if same.ndim > 1:
+                same = np.all(same, axis=1)
+            repeated = np.flatnonzero(same) + 1 - (start - first)
+            block = block[start - first:]
+            if len(repeated) > 0:
+                block = block[:repeated[0]]
+            self.merge_chunk(stats, check(block, sensitivity))
+            if len(repeated) > 0:
+                # returns the number of records checked, and True if the log ended at a repeated record
+                return start + len(block), True
+        return len(records), False
+
+    # check a chunk of packed records
+    def check_packed_records(self, block, sensitivity):
+        return self.validate_codes(block["flag"], [block[name].astype(np.uint64) for name in block.dtype.names[1:]],
+                                   sensitivity)
+
+    # check a chunk of lines of a mapped text log, given as rows of characters
+    def check_text_rows(self, block, sensitivity):
+        if self.profile is not None:
+            start = perf_counter()
+        valid, flags, *codes = parse_records(block, *digit_sizes(self.config.N, self.config.input_type,
+                                                                 self.operation.widths))
+        if self.profile is not None:
+            self.profile.add("parse (NumPy)", perf_counter() - start)
+        if self.config.input_type == self.config.output_type and np.all(valid):
+            return self.validate_codes(flags, codes, sensitivity)
+        # lines not following the layout are checked as strings, as the line by line mode does
+        return self.validate_chunk([bytes(row).decode(errors="replace") for row in block], sensitivity)
+
+    # options that must not change between a run and its resumption
+    def checkpoint_key(self):
+        c = self.config
+        return [c.N, c.ES, c.input_type, c.output_type, c.rounding_tolerance, c.limit_rows_per_file,
+                c.exact_reference, c.batch_size, c.operation, c.histograms, list(c.relative_error_range)]
+
+    # save the state of the run; lines read after the last checkpoint will be read again when resuming
+    def save_checkpoint(self, stats, last_line):
+        # the samples of the lines read so far are written, so that the sink can be resumed from its size
+        sink = None
+        if self.config.sink_file is not None:
+            self.write_samples(stats)
+            if self.sink is not None:
+                sink = {"offset": self.sink.flush(), "written": self.sink.written}
+        state = {"config": self.checkpoint_key(), "files_done": self.files_done, "position": self.position,
+                 "last_line": last_line, "stats": stats.to_dict(), "sampled": stats.sampled, "sink": sink}
+        # the previous checkpoint is replaced only when the new one is complete
+        temp_file = self.config.checkpoint_file + ".tmp"
+        with open(temp_file, "w") as f:
+            json.dump(state, f)
+        replace(temp_file, self.config.checkpoint_file)
+        self.last_checkpoint = monotonic()
+
+    # save a checkpoint if enough time has passed since the last one
+    def tick(self, stats, last_line):
+        if self.position is not None and monotonic() - self.last_checkpoint >= self.config.checkpoint_interval:
+            self.save_checkpoint(stats, last_line)
+
+    # state saved by an interrupted run, None if there is none
+    def load_checkpoint(self):
+        if not isfile(self.config.checkpoint_file):
+            return None
+        with open(self.config.checkpoint_file, "r") as f:
+            state = json.load(f)
+        if state["config"] != self.checkpoint_key():
+            raise ValueError(self.config.checkpoint_file + " was saved by a run with a different configuration")
+        return state
+
+    # validate a text log line by line from a byte offset, keeping track of the position for the checkpoints
+    def validate_text_log(self, input_file, max_lines, stats, position=None):
+        # $position: [file, byte offset, lines read] where an interrupted run stopped, if any
+        offset, file_lines = (position[1], position[2]) if position is not None else (0, 0)
+        if max_lines >= 0:
+            max_lines = max(max_lines - file_lines, 0)
+        self.position = [input_file, offset, file_lines]
+        self.source = (input_file, stats.read - file_lines)
+
+        def lines(f):
+            f.seek(offset)
+            for line in self.log_lines(f):
+                self.position[1] += len(line)
+                self.position[2] += 1
+                yield line.decode(errors="replace")
+
+        self.message("Starting: scan ", input_file)
+        if file_lines > 0:
+            self.message("Resuming from line ", file_lines + 1)
+        with open_log(join(self.config.path, input_file), "rb") as f, closing(lines(f)) as file_lines:
+            stop, self.last_line_read = self.scan_lines(file_lines, stats, self.output_sensitivity(),
+                                                        self.last_line_read, max_lines)
+        self.position = None
+        if stop is not None:
+            self.message(stop)
+        self.message("Scan completed")
+
+    # validate the lines of a text log, given as any iterable of strings (e.g. an open file)
+    def validate_stream(self, lines, max_lines=None, stats=None, name="stream"):
+        # $max_lines: max lines to read; None for the configured limit, -1 to read all of them
+        # $stats: statistics to be updated; new statistics are created if not given
+        if max_lines is None:
+            max_lines = self.config.limit_rows_per_file
+        if stats is None:
+            stats = self.new_stats()
+        self.source = (name, stats.read)
+        self.message("Starting: scan ", name)
+        stop, self.last_line_read = self.scan_lines(lines, stats, self.output_sensitivity(), self.last_line_read,
+                                                    max_lines)
+        if stop is not None:
+            self.message(stop)
+        self.message("Scan completed")
+        # returns the statistics
+        return stats
+
+    # validate the records of a log already split in variables
+    def validate_records(self, records, stats=None, name="records"):
+        # $records: packed records (see log_formats.record_type), or (flag, A, B, C, Out) tuples with integer codes
+        #           (the operands of the operation between the flag and Out)
+        # the end of the log is not searched among records: all of them are checked
+        if stats is None:
+            stats = self.new_stats()
+        self.source = (name, stats.read)
+        sensitivity = self.output_sensitivity()
+        if np is not None and getattr(records, "dtype", None) is not None:
+            self.merge_chunk(stats, self.check_packed_records(records, sensitivity))
+            return stats
+        records = list(records)
+        if np is not None:
+            flags = np.array([ord(r[0]) for r in records], dtype=np.uint8)
+            codes = [np.array([r[i] for r in records], dtype=np.uint64)
+                     for i in range(1, len(self.variable_binary_lens) + 1)]
+            self.merge_chunk(stats, self.validate_codes(flags, codes, sensitivity))
+            return stats
+        for flag, *codes in records:
+            if flag == "x":
+                stats.read += 1
+                stats.discarded += 1
+                stats.add_sample(stats.read, "x", None)
+                continue
+            msg, values = self.check_values([format(code, "0" + str(length) + "b")
+                                             for code, length in zip(codes, self.variable_binary_lens)],
+                                            stats, sensitivity)
+            if msg == "e" and stats.add_error((stats.read,) + values):
+                self.print_line(stats.read, msg, values)
+            stats.add_sample(stats.read, msg, values)
+        self.write_samples(stats)
+        # returns the statistics
+        return stats
+
+    # validate a log file, choosing the reader from its extension and the configuration
+    # file names are relative to the configured path
+    def validate_file(self, input_file, max_lines=None, stats=None):
+        # $max_lines: max lines to read; None for the configured limit, -1 to read all of them
+        # $stats: statistics to be updated; new statistics are created if not given
+        if max_lines is None:
+            max_lines = self.config.limit_rows_per_file
+        if stats is None:
+            stats = self.new_stats()
+        if input_file.endswith(packed_extension):
+            self.validate_packed_log(input_file, max_lines, stats)
+        elif (self.config.reader == "mmap" and np is not None and not self.config.verbose
+              and not input_file.endswith(compressed_extensions)):
+            self.validate_mapped_log(input_file, max_lines, stats)
+        elif self.config.pipeline:
+            with open_log(join(self.config.path, input_file), "rb") as f, closing(self.log_lines(f)) as lines:
+                self.validate_stream((line.decode(errors="replace") for line in lines), max_lines, stats, input_file)
+        else:
+            with open_log(join(self.config.path, input_file), "r") as f:
+                self.validate_stream(f, max_lines, stats, input_file)
+        # returns the statistics
+        return stats
+
+    # validate a packed log (see log_formats.py), a chunk of records at a time
+    def validate_packed_log(self, input_file, max_lines, stats):
+        self.source = (input_file, stats.read)
+        self.message("Starting: scan ", input_file)
+        if np is None:
+            self.message("NumPy not available: packed log skipped")
+            return
+        p_size, operation, records, trailing = read_packed(join(self.config.path, input_file))
+        if p_size != self.config.N:
+            self.message("Log written for N = ", p_size, ": skipped")
+            return
+        if operation != self.operation.name:
+            self.message("Log written for operation ", operation, ": skipped")
+            return
+        stop = None
+        if 0 <= max_lines < len(records):
+            records = records[:max_lines]
+            stop = "Enforced shut down: reached limit of max lines for this file"
+        elif trailing > 0:
+            stop = "Incomplete line trimmed out"
+        if self.scan_blocks(records, self.check_packed_records, stats, self.output_sensitivity())[1]:
+            stop = "End of file reached"
+        if stop is not None:
+            self.message(stop)
+        self.message("Scan completed")
+
+    # validate a fixed-width text log mapped in memory, a chunk of lines at a time
+    # lines are read from the mapped file as rows of characters, without building a string per line
+    def validate_mapped_log(self, input_file, max_lines, stats):
+        self.source = (input_file, stats.read)
+        self.message("Starting: scan ", input_file)
+        rows, tail, broken = map_text_log(join(self.config.path, input_file))
+        tail = tail.rstrip()
+        width = rows.shape[1]
+        sensitivity = self.output_sensitivity()
+        last_line_read = self.last_line_read
+        stop = None
+        first_line = bytes(rows[0]) if len(rows) > 0 else tail
+        if len(rows) == 0 and tail == b"":
+            pass
+        elif last_line_read is not None and last_line_read.encode() == first_line:
+            stop = "End of file reached"
+        elif last_line_read is not None and len(last_line_read) != len(first_line):
+            stop = "Incomplete line trimmed out"
+        else:
+            limit = len(rows) if max_lines < 0 else min(len(rows), max_lines)
+            checked, repeated = self.scan_blocks(rows[:limit], self.check_text_rows, stats, sensitivity)
+            if checked > 0:
+                last_line_read = bytes(rows[checked - 1]).decode(errors="replace")
+            if repeated:
+                stop = "End of file reached"
+            elif limit < len(rows):
+                # the line after the limit is read, as the line by line reader does, unless it ends the log
+                if limit > 0 and bytes(rows[limit]) == bytes(rows[limit - 1]):
+                    stop = "End of file reached"
+                else:
+                    last_line_read = bytes(rows[limit]).decode(errors="replace")
+                    stop = "Enforced shut down: reached limit of max lines for this file"
+            elif broken:
+                stop = "Incomplete line trimmed out"
+            elif tail != b"":
+                # last line without terminator: the last line read stays the last complete row, unless this line
+                # is read too (as the line by line reader does, a truncated or repeated line is never stored)
+                if len(rows) > 0 and tail == bytes(rows[-1]):
+                    stop = "End of file reached"
+                elif len(tail) != width:
+                    stop = "Incomplete line trimmed out"
+                else:
+                    last_line_read = tail.decode(errors="replace")
+                    if limit == max_lines:
+                        stop = "Enforced shut down: reached limit of max lines for this file"
+                    else:
+                        self.merge_chunk(stats, self.check_text_rows(np.frombuffer(tail, dtype=np.uint8)
+                                                                     .reshape(1, width), sensitivity))
+        self.last_line_read = last_line_read
+        if stop is not None:
+            self.message(stop)
+        self.message("Scan completed")
+
+    # split a log in byte ranges of about shard_bytes, starting at the beginning of a line
+    def plan_shards(self, input_file, max_lines=-1):
+        file_name = join(self.config.path, input_file)
+        if input_file.endswith(compressed_extensions):
+            # a compressed log cannot be split without decompressing it: it is a single shard up to its end
+            return [(0, -1)]
+        size = getsize(file_name)
+        bounds = [0]
+        # a limit on the lines of the file can only be enforced reading it from the beginning
+        if max_lines < 0:
+            with open(file_name, "rb") as f:
+                for target in range(self.config.shard_bytes, size, self.config.shard_bytes):
+                    if target <= bounds[-1]:
+                        continue
+                    f.seek(target)
+                    f.readline()
+                    if f.tell() >= size:
+                        break
+                    bounds.append(f.tell())
+        bounds.append(size)
+        # returns a list of (start, end) byte offsets
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    # validate the lines in a byte range of a log, without console output
+    def scan_shard(self, input_file, start, end, max_lines):
+        # $end: end byte of the shard; -1 to read until the end of the log
+        stats = self.new_stats()
+
+        def lines(f):
+            f.seek(start)
+            for line in self.log_lines(f, end - start if end >= 0 else -1):
+                yield line.decode(errors="replace")
+
+        with open_log(join(self.config.path, input_file), "rb") as f:
+            # the line before the shard is needed to detect the end of the log at the first line
+            last_line = previous_line(f, start) if start > 0 else None
+            with closing(lines(f)) as shard_lines:
+                stop, last_line = self.scan_lines(shard_lines, stats, self.output_sensitivity(), last_line, max_lines,
+                                                  False)
+        # only the counters of the caches are sent back
+        for memo in (self.decode_memo, self.classify_memo):
+            if memo is not None:
+                memo.clear()
+        # returns the statistics of the shard (line numbers starting from 1), why it stopped, the last line read,
+        # the profile of the shard (None unless profiling is enabled) and its caches (None unless enabled)
+        return stats, stop, last_line, self.profile, (self.decode_memo, self.classify_memo)
+
+    # True if the text logs are split in shards validated by other processes
+    def sharded(self):
+        return self.config.processes > 0 or self.config.coordinator is not None
+
+    # validate text logs with a pool of worker processes, or with the workers of a coordinator
+    def validate_parallel(self, input_files, max_lines, stats):
+        c = self.config
+        shards = [[(c, input_file, start, end, max_lines)
+                   for start, end in self.plan_shards(input_file, max_lines)] for input_file in input_files]
+        tasks = [task for file_shards in shards for task in file_shards]
+        if c.coordinator is None:
+            with Pool(c.processes) as pool:
+                self.merge_shards(input_files, shards, pool.imap(validate_shard, tasks), stats)
+            return
+        key = c.coordinator_key.encode() if c.coordinator_key is not None else None
+        with Coordinator(tasks, parse_address(c.coordinator), key, c.local_workers, validate_shard, c.shard_retries,
+                         c.shard_timeout) as queue:
+            self.message("Shards handed out on ", ":".join(map(str, queue.address)))
+            self.merge_shards(input_files, shards, queue.results(), stats)
+
+    # merge the statistics of the shards of text logs in order, as the results of their validation arrive
+    def merge_shards(self, input_files, shards, results, stats):
+        # $shards: the tasks of each log
+        # $results: iterator over the results of the tasks, in their order
+        for input_file, file_shards in zip(input_files, shards):
+            self.source = (input_file, stats.read)
+            self.message("Starting: scan ", input_file)
+            # shards are validated without the last line of the previous file: check the first line here
+            with open_log(join(self.config.path, input_file), "r") as f:
+                first_line = f.readline()
+            stop = None
+            if first_line != "":
+                if self.last_line_read == first_line.rstrip():
+                    stop = "End of file reached"
+                elif self.last_line_read is not None and len(self.last_line_read) != len(first_line.rstrip()):
+                    stop = "Incomplete line trimmed out"
+            for _ in file_shards:
+                shard_stats, shard_stop, shard_last_line, shard_profile, shard_memos = next(results)
+                if shard_profile is not None:
+                    self.profile.merge(shard_profile)
+                for memo, shard_memo in zip((self.decode_memo, self.classify_memo), shard_memos):
+                    if shard_memo is not None:
+                        memo.merge(shard_memo)
+                if stop is not None:
+                    # the log ended in a previous shard; the rest of the file is ignored
+                    continue
+                self.merge_chunk(stats, shard_stats)
+                if shard_last_line is not None:
+                    self.last_line_read = shard_last_line
+                stop = shard_stop
+            if stop is not None:
+                self.message(stop)
+            self.message("Scan completed")
+
+    # validate a list of logs as a single run: text logs first (in parallel, if configured), then packed logs
+    # if a checkpoint file is configured, the run resumes from it, and text logs are read line by line in this process
+    def validate_files(self, input_files, max_lines=None, stats=None):
+        if max_lines is None:
+            max_lines = self.config.limit_rows_per_file
+        if stats is None:
+            stats = self.new_stats()
+        start = perf_counter()
+        checkpoints = self.config.checkpoint_file is not None
+        resume = self.load_checkpoint() if checkpoints else None
+        if resume is not None:
+            self.message("Resuming from ", self.config.checkpoint_file)
+            stats.merge(ValidationStats.from_dict(resume["stats"], self.config.limit_errors_to_display))
+            self.last_line_read = resume["last_line"]
+            self.files_done = resume["files_done"]
+            # the limits of the samples go on from the ones taken, and the sink from the rows written
+            stats.sampled = dict(resume.get("sampled", {}))
+            if self.config.sink_file is not None and resume.get("sink") is not None:
+                self.open_sink(resume["sink"]["offset"], resume["sink"]["written"])
+            input_files = [file for file in input_files if file not in self.files_done]
+        if zstandard is None and any(file.endswith(".zst") for file in input_files):
+            self.message("zstandard not available: logs compressed with zstd skipped")
+            input_files = [file for file in input_files if not file.endswith(".zst")]
+        text_files = [file for file in input_files if not file.endswith(packed_extension)]
+        packed_files = [file for file in input_files if file.endswith(packed_extension)]
+        if self.config.result_cache is not None and not checkpoints and self.config.sink_file is None:
+            # one log at a time, so that each result can be stored (text logs are still split among the workers)
+            for file in text_files + packed_files:
+                self.validate_cached(file, max_lines, stats)
+            packed_files = []
+        elif self.sharded() and not checkpoints:
+            self.validate_parallel(text_files, max_lines, stats)
+        else:
+            for file in text_files:
+                if checkpoints:
+                    position = resume["position"] if resume is not None else None
+                    self.validate_text_log(file, max_lines, stats, position if position and position[0] == file else None)
+                    self.files_done.append(file)
+                    self.save_checkpoint(stats, self.last_line_read)
+                else:
+                    self.validate_file(file, max_lines, stats)
+        # packed logs are already checked a chunk at a time with NumPy
+        for file in packed_files:
+            self.validate_file(file, max_lines, stats)
+            if checkpoints:
+                self.files_done.append(file)
+                self.save_checkpoint(stats, self.last_line_read)
+        # the run is complete: the next one starts from the beginning
+        if checkpoints:
+            remove(self.config.checkpoint_file)
+        if self.profile is not None:
+            self.profile.add("total", perf_counter() - start)
+        # returns the statistics of all files
+        return stats
+
+    # key of the result of a log in the result cache: its content, the options changing the result, and the last line
+    # of the previous log (a log starting with it, or with a line of different length, ends at its first line)
+    def result_key(self, input_file, max_lines):
+        c = self.config
+        options = [result_cache_version, c.N, c.ES, c.input_type, c.output_type, c.rounding_tolerance, max_lines,
+                   c.exact_reference, c.operation, c.histograms, list(c.relative_error_range)]
+        content = file_digest(join(c.path, input_file), c.hash_block_bytes)
+        # returns a hexadecimal string
+        return hashlib.sha256(json.dumps([content, options, self.last_line_read]).encode()).hexdigest()
+
+    # validate a log, or take its result from the result cache if the same log has already been validated
+    def validate_cached(self, input_file, max_lines, stats):
+        if self.profile is not None:
+            start = perf_counter()
+        key = self.result_key(input_file, max_lines)
+        entry_file = join(self.config.result_cache, key + ".json")
+        entry = None
+        if isfile(entry_file):
+            with open(entry_file, "r") as f:
+                entry = json.load(f)
+        if self.profile is not None:
+            self.profile.add("result cache", perf_counter() - start)
+        # error samples of a log are complete, unless the limit of samples cut them: then they are enough only if no
+        # more samples than those can be kept now
+        room = stats.max_errors - len(stats.errors)
+        if entry is not None and (entry["complete"] or 0 <= room <= len(entry["stats"]["errors"])):
+            self.message("Unchanged log, result taken from the result cache: ", input_file)
+            self.merge_chunk(stats, ValidationStats.from_dict(entry["stats"]))
+            self.last_line_read = entry["last_line"]
+            self.cache_hits += 1
+            return
+        read, errors = stats.read, len(stats.errors)
+        counters = [stats.correct, stats.mistakes, stats.approx_ok, stats.approx_no, stats.discarded]
+        # the errors of the log are counted in histograms of their own, added to the ones of the run afterwards
+        histograms = stats.histograms
+        if histograms is not None:
+            stats.histograms = self.new_stats().histograms
+        if self.sharded() and not input_file.endswith(packed_extension):
+            self.validate_parallel([input_file], max_lines, stats)
+        else:
+            self.validate_file(input_file, max_lines, stats)
+        # the result of the log alone, with line numbers starting from 1
+        result = ValidationStats()
+        result.read = stats.read - read
+        (result.correct, result.mistakes, result.approx_ok, result.approx_no, result.discarded) = (
+            now - before for now, before in zip([stats.correct, stats.mistakes, stats.approx_ok, stats.approx_no,
+                                                 stats.discarded], counters))
+        result.errors = [(sample[0] - read,) + tuple(sample[1:]) for sample in stats.errors[errors:]]
+        if histograms is not None:
+            result.histograms = stats.histograms
+            stats.histograms = histograms.merge(result.histograms)
+        state = {"file": input_file, "complete": len(result.errors) == result.mistakes, "stats": result.to_dict(),
+                 "last_line": self.last_line_read}
+        # written to a temporary file first, as the checkpoints
+        makedirs(self.config.result_cache, exist_ok=True)
+        temp_file = entry_file + ".tmp"
+        with open(temp_file, "w") as f:
+            json.dump(state, f)
+        replace(temp_file, entry_file)
+        self.cache_misses += 1
+
+    # read the lines appended to a followed log since the last call, and validate the complete ones
+    # validation stops early if the followed logs have as many mistakes as allowed
+    def follow_step(self, log, sensitivity, logs):
+        with open(join(self.config.path, log.name), "rb") as f:
+            f.seek(log.offset)
+            data = f.read(self.config.follow_read_bytes)
+        if not data:
+            return False
+        log.offset += len(data)
+        data = log.partial + data
+        # the last line is kept until it is complete
+        end = data.rfind(b"\n") + 1
+        log.partial = data[end:]
+        lines = [line.decode(errors="replace") for line in data[:end].split(b"\n")[:-1]]
+        # each followed log counts its lines from 1
+        self.source = (log.name, 0)
+        group = max(self.config.batch_size, 1000)
+        for first in range(0, len(lines), group):
+            if self.fail_fast(logs):
+                break
+            part = lines[first:first + group]
+            log.stop, log.last_line = self.scan_lines(part, log.stats, sensitivity, log.last_line, log.lines_left,
+                                                      follow=True)
+            if log.lines_left > 0:
+                log.lines_left = max(log.lines_left - len(part), 0)
+            if log.stop is not None:
+                self.message(log.name, ": ", log.stop)
+                break
+        # returns True if the log has grown
+        return True
+
+    # validate the lines of the text logs in the configured path while they are written
+    # each log keeps its own line numbers; its statistics are merged in the result
+    # a log is followed until follow_idle or fail fast end the run (or its limit of lines is reached): a repeated line
+    # does not end it, since the simulation may write the same stimulus again
+    def follow_logs(self, stats=None, callback=None):
+        # $stats: statistics to be updated; new statistics are created if not given
+        # $callback: function called with the statistics of all logs every time new lines have been validated
+        if stats is None:
+            stats = self.new_stats()
+        logs = {}
+        sensitivity = self.output_sensitivity()
+        last_growth = start = monotonic()
+        try:
+            while True:
+                grown = False
+                for name in self.log_files():
+                    # packed and compressed logs cannot be followed while they are written
+                    if name.endswith(packed_extension) or name.endswith(compressed_extensions):
+                        continue
+                    if name not in logs:
+                        self.message("Following ", name)
+                        logs[name] = FollowedLog(name, self.config.limit_rows_per_file, self.new_stats())
+                    log = logs[name]
+                    while log.stop is None and not self.fail_fast(logs) and self.follow_step(log, sensitivity, logs):
+                        grown = True
+                if grown and callback is not None:
+                    callback(self.new_stats().merge_all(followed.stats for followed in logs.values()))
+                if self.fail_fast(logs):
+                    self.message("Fail fast: ", sum(followed.stats.mistakes for followed in logs.values()),
+                                 " mistakes found")
+                    break
+                if grown:
+                    last_growth = monotonic()
+                elif 0 <= self.config.follow_idle <= monotonic() - last_growth:
+                    self.message("No new lines for ", self.config.follow_idle, " seconds: follow mode ended")
+                    break
+                else:
+                    sleep(self.config.follow_interval)
+        except KeyboardInterrupt:
+            self.message("Follow mode interrupted")
+        if self.profile is not None:
+            self.profile.add("total", monotonic() - start)
+        # returns the statistics of all logs
+        return stats.merge_all(followed.stats for followed in logs.values())
+
+    # True if the followed logs have as many mistakes as allowed
+    def fail_fast(self, logs):
+        return 0 <= self.config.max_mistakes <= sum(followed.stats.mistakes for followed in logs.values())
+
+    # all the logs in the configured path whose name contains N
+    def log_files(self):
+        folder = self.config.path
+        return [f for f in listdir(folder) if isfile(join(folder, f)) and f.__contains__(str(self.config.N))]
+
+    # golden log of a log of path: the golden log itself, or the log with the same name in the folder of golden logs
+    def golden_log(self, input_file):
+        golden = self.config.golden
+        return join(golden, input_file) if isdir(golden) else golden
+
+    # lines of a log without terminator, until it ends as scan_lines finds it (a line equal to the one before it, or
+    # of different length) or max_lines have been read; the reason why it ended is appended to $stops
+    @staticmethod
+    def bounded_lines(lines, max_lines, stops):
+        last_line = None
+        for line in lines:
+            raw_input = line.rstrip()
+            if last_line == raw_input:
+                stops.append("End of file reached")
+                return
+            if last_line is not None and len(last_line) != len(raw_input):
+                stops.append("Incomplete line trimmed out")
+                return
+            last_line = raw_input
+            if max_lines == 0:
+                stops.append("Enforced shut down: reached limit of max lines for this file")
+                return
+            if max_lines > 0:
+                max_lines -= 1
+            yield raw_input
+
+    # variables of a line as binary strings (the operands, then the output), or None if the line is discarded
+    def parse_line(self, raw_input):
+        hex_input, hex_output = self.config.input_type == "hex", self.config.output_type == "hex"
+        try:
             in_vector, out_vector, flag = extract_raw_input(raw_input)
+            if (flag == "x" or len(in_vector) != (self.In_h_len if hex_input else self.In_binary_len)
+                    or len(out_vector) != (self.Out_h_len if hex_output else self.Out_binary_len)):
+                return None
+            variables = self.split_variables(in_vector, out_vector)
+            int(variables[-1], 2)
+        except (IndexError, ValueError):
+            # a line not following the layout, or with digits that are not binary (hexadecimal)
+            return None
+        # returns a list of strings
+        return variables
 
-            # check correct size of input string
-            if input_type == "hex":
-                if len(in_vector) != A_h_len + B_h_len + C_h_len:
-                    if verbose:
-                        print("Invalid input arguments for line ", Read)
-                    Discarded += 1
-                    Read += 1
-                    last_msg = "x"
-            else:
-                if len(in_vector) != A_binary_len + B_binary_len + C_binary_len:
-                    if verbose:
-                        print("Invalid input arguments for line ", Read)
-                    Discarded += 1
-                    Read += 1
-                    last_msg = "x"
-            # check correct size of output string
-            if input_type == "hex":
-                if len(out_vector) != Out_h_len:
-                    if verbose:
-                        print("Invalid output arguments for line ", Read)
-                    Discarded += 1
-                    Read += 1
-                    last_msg = "x"
+    # compare a log with its golden log, matching their lines by operands while they are read together
+    # every line waits in an index of its log, keyed on its operands, until the other log reaches the same operands:
+    # each line takes constant time, and the lines waiting are as many as the logs are misaligned
+    def compare_log(self, input_file, max_lines, stats):
+        golden_file = self.golden_log(input_file)
+        p_size = self.config.N
+        # lines waiting for their match, in the DUT and in the golden log: operands -> deque of (line, output),
+        # in the order of the log (lines with the same operands are matched first to first)
+        pending = ({}, {})
+        waiting = 0
+        numbers = [0, 0]  # lines read in the DUT and in the golden log
+        stops = ([], [])
+        self.message("Starting: compare ", input_file, " with ", golden_file)
+        with open_log(join(self.config.path, input_file), "rb") as f, open_log(golden_file, "rb") as g:
+            logs = [self.bounded_lines((line.decode(errors="replace") for line in self.log_lines(log)), max_lines,
+                                       stop) for log, stop in zip((f, g), stops)]
+            for pair in zip_longest(*logs):
+                for side, raw_input in enumerate(pair):
+                    if raw_input is None:
+                        continue
+                    numbers[side] += 1
+                    if side == 0:
+                        stats.read += 1
+                    else:
+                        stats.golden_read += 1
+                    variables = self.parse_line(raw_input)
+                    if variables is None:
+                        if side == 0:
+                            stats.discarded += 1
+                        else:
+                            stats.golden_discarded += 1
+                        continue
+                    operands = tuple(variables[:-1])
+                    others = pending[1 - side].get(operands)
+                    if others is None:
+                        # the other log has not reached these operands yet
+                        pending[side].setdefault(operands, deque()).append((numbers[side], variables[-1]))
+                        waiting += 1
+                        if waiting > stats.max_pending:
+                            stats.max_pending = waiting
+                        continue
+                    line, out = others.popleft()
+                    if not others:
+                        del pending[1 - side][operands]
+                    waiting -= 1
+                    (dut_line, dut_out), (golden_line, golden_out) = (((numbers[0], variables[-1]), (line, out))
+                                                                      if side == 0 else
+                                                                      ((line, out), (numbers[1], variables[-1])))
+                    distance = code_distance(int(dut_out, 2), int(golden_out, 2), p_size)
+                    stats.add(distance)
+                    if distance > 0:
+                        sample = (input_file, dut_line, golden_line) + operands + (dut_out, golden_out, distance)
+                        if stats.add_sample(stats.mismatches, sample):
+                            self.print_mismatch(sample)
+                if self.config.show_progress and numbers[0] % 100 == 0:
+                    self.progress(stats)
+        # lines whose operands are not in the other log, in the order of their log
+        for side, name in enumerate(("DUT", "golden")):
+            orphans = sorted((line, operands, out) for operands, lines in pending[side].items() for line, out in lines)
+            if side == 0:
+                stats.unmatched += len(orphans)
             else:
-                if len(out_vector) != Out_binary_len:
-                    if verbose:
-                        print("Invalid output arguments for line ", Read)
-                    Discarded += 1
-                    Read += 1
-                    last_msg = "x"
-            # if the network was not ready to produce the output yet (usually the very first clock posedge)
-            if flag == 'x':
-                if verbose:
-                    print("Invalid line ", Read)
-                Discarded += 1
-                Read += 1
-                last_msg = "x"
+                stats.golden_unmatched += len(orphans)
+            for line, operands, out in orphans:
+                if not stats.add_sample(stats.orphans, (input_file, name, line) + operands + (out,)):
+                    break
+            if stops[side]:
+                self.message(("DUT log: ", "Golden log: ")[side], stops[side][0])
+        self.message("Comparison completed")
 
+    # compare the logs of path with their golden logs
+    def compare_files(self, input_files, max_lines=None, stats=None):
+        # $stats: DifferentialStats to be updated; new statistics are created if not given
+        if max_lines is None:
+            max_lines = self.config.limit_rows_per_file
+        if stats is None:
+            stats = DifferentialStats(self.config.N, self.config.rounding_tolerance,
+                                      self.config.limit_errors_to_display)
+        for file in input_files:
+            golden_file = self.golden_log(file)
+            if file.endswith(packed_extension):
+                self.message("Packed logs are not compared: ", file, " skipped")
+            elif zstandard is None and (file.endswith(".zst") or golden_file.endswith(".zst")):
+                self.message("zstandard not available: ", file, " skipped")
+            elif not isfile(golden_file):
+                self.message("Golden log not found: ", golden_file, " (", file, " skipped)")
             else:
-                # cut the arrays into variables
-                a_b, b_b, c_b, out_b = split_variables(in_vector, out_vector)
-                # convert hex variables into binary variables, then to real variables
-                a_f = posit2real(a_b, 2 * N, ES)
-                b_f = posit2real(b_b, N, ES)
-                c_f = posit2real(c_b, N, ES)
-                out_f = posit2real(out_b, N, ES)
-
-                # compare output and expected output
-                e, negligible = calculate_error(a_f, b_f, c_f, out_f, sensitivity)
-
-                if e != 0:
-                    Read += 1
-                    if negligible:
-                        # the output cannot be represented, so the error is due to rounding
-                        Approx_ok += 1
-                        last_msg = "a"
-                    else:
-                        # output might be not representable
-                        o_lb_f = posit2real(binary_diff(N, out_b, str(rounding_tolerance).zfill(N)), N,
-                                            ES)
-                        o_ub_f = posit2real(binary_sum(N, out_b, str(rounding_tolerance).zfill(N)), N, ES)
+                self.compare_log(file, max_lines, stats)
+        # returns the statistics of all pairs of logs
+        return stats
 
-                        e_low, _ = calculate_error(a_f, b_f, c_f, o_lb_f, 0)
-                        e_upp, _ = calculate_error(a_f, b_f, c_f, o_ub_f, 0)
+    # validation report
+    def print_report(self, stats):
+        print("\n ========= Analysis completed ========= ")
+        print("# Lines read: " + str(stats.read))
+        print("# Discarded lines: " + str(stats.discarded))
+        print("\n # Representable output: ", str(stats.correct + stats.mistakes))
+        print("Correct results: " + str(stats.correct))
+        print("Mistakes: " + str(stats.mistakes))
+        print("\n # Not representable output: ", str(stats.approx_ok + stats.approx_no))
+        print("Approximation radius: ", self.config.rounding_tolerance, " consecutive posits")
+        print("Correctly approximated: " + str(stats.approx_ok))
+        print("Wrongly approximated: " + str(stats.approx_no))
+        if self.sink is not None:
+            print("\n # Lines written to " + self.sink.file_name)
+            for msg in "veaox":
+                print(verbose_msg(msg).rstrip() + ": " + str(self.sink.written.get(msg, 0)))
+        if self.cache_hits + self.cache_misses > 0:
+            print("\n # Result cache (" + self.config.result_cache + ")")
+            print("Logs taken from the cache: " + str(self.cache_hits))
+            print("Logs validated and stored: " + str(self.cache_misses))
+        if stats.histograms is not None:
+            self.print_histograms(stats.histograms)
+        if self.classify_memo is not None:
+            self.print_memos()
+        if self.profile is not None:
+            self.print_profile(stats)
 
-                        # if the correct result is between two consecutive posit, then
-                        # the error for them should have different sign
+    # histograms section of the report: the buckets holding lines, for all the groups together
+    def print_histograms(self, histograms):
+        ulp, relative = histograms.bucket_labels()
+        total = histograms.summary()[-1]
+        print("\n # Code distance from the expected output (lines)")
+        for label, lines in zip(ulp, total["ulp"]):
+            if lines > 0:
+                print(label + ": " + str(lines))
+        print("\n # Relative error (lines)")
+        for label, lines in zip(relative, total["relative"]):
+            if lines > 0:
+                print(label + ": " + str(lines))
+        if total["mean_relative_error"] is not None:
+            print("Mean relative error: " + str(total["mean_relative_error"]))
+        print("Groups of expected results (sign, regime, exponent): " + str(len(histograms.groups)))
 
-                        if sign(e) != sign(e_low):
-                            Approx_ok += 1  # up rounding has happened
-                            last_msg = "a"
-                        else:
-                            if sign(e) != sign(e_upp):
-                                Approx_ok += 1  # down rounding has happened
-                                last_msg = "a"
-                            else:  # error is beyond approximation threshold
-                                representable = isRepresentable(expected_output(a_f, b_f, c_f), N, ES)
-                                if representable:
-                                    Mistakes += 1
-                                    last_msg = "e"
-                                else:
-                                    Approx_no += 1
-                                    last_msg = "o"
+    # cache section of the report
+    def print_memos(self):
+        print("\n # Caches (" + str(self.config.memo_size) + " entries each)")
+        for name, memo in (("Decoded values", self.decode_memo), ("Classifications", self.classify_memo)):
+            lookups = memo.hits + memo.misses
+            print(name + ": " + str(memo.hits) + " hits, " + str(memo.misses) + " misses"
+                  + (", " + format(100 * memo.hits / lookups, ".1f") + "% hit rate" if lookups > 0 else ""))
 
-                else:
-                    # the output can be represented and it is correct
-                    Read += 1
-                    Correct += 1
-                    last_msg = "v"
-            if show_progress and Read % 1000 == 0:
-                print("Reached line ", Read)
-            if verbose or ((last_msg == "e") and (errors_displayed < limit_errors_to_display)):
-                print("Line: ", str(Read))
-                if last_msg != "x":
-                    print("A: ", a_b, " -> ", a_f)
-                    print("B: ", b_b, " -> ", b_f)
-                    print("C: ", c_b, " -> ", c_f)
-                    print("Out: ", out_b, " -> ", out_f)
-                    print(out_f, " = ", a_f, " + ", b_f * c_f, " + error")
-                    print("Error: " + str(e))
-                print("Decision: ", verbose_msg(last_msg))
-                if last_msg == "e":
-                    errors_displayed += 1
-        f.close()
-        print("Scan completed")
+    # profile section of the report
+    def print_profile(self, stats):
+        profile = self.profile
+        total = profile.seconds.get("total", 0.0)
+        print("\n ========= Profile ========= ")
+        # stages are nested (e.g. rounding window is part of classify): percentages do not add up to 100
+        if self.sharded():
+            print("Time of the worker processes is summed: stages can take more than the total")
+        for stage in sorted(profile.calls, key=lambda name: -profile.seconds[name]):
+            calls, seconds = profile.calls[stage], profile.seconds[stage]
+            print(stage + ": " + str(calls) + " calls, " + format(seconds, ".3f") + " s, "
+                  + format(seconds / calls * 1e6, ".2f") + " us/call"
+                  + (", " + format(100 * seconds / total, ".1f") + "%" if total > 0 else ""))
+        if total > 0:
+            print("Lines per second: " + format(stats.read / total, ".0f"))
+        print("\n # Classification paths")
+        for path, lines in sorted(profile.paths.items(), key=lambda item: -item[1]):
+            print(path + ": " + str(lines) + " lines" + (", " + format(100 * lines / stats.read, ".1f") + "%"
+                                                        if stats.read > 0 else ""))
+
+    # save the profile as JSON, with the statistics of the run it measured
+    def save_profile(self, stats, file_name):
+        with open(file_name, "w") as f:
+            json.dump({"N": self.config.N, "ES": self.config.ES, "operation": self.config.operation,
+                       "lines": stats.read, **self.profile.to_dict()}, f, indent=1)
+
+    # differential report, comparing the logs with the golden ones
+    def print_differential_report(self, stats):
+        print("\n ========= Comparison with the golden model completed ========= ")
+        print("# Lines read: " + str(stats.read) + " (golden: " + str(stats.golden_read) + ")")
+        print("# Discarded lines: " + str(stats.discarded) + " (golden: " + str(stats.golden_discarded) + ")")
+        print("# Lines without a match: " + str(stats.unmatched) + " (golden: " + str(stats.golden_unmatched) + ")")
+        print("\n # Matched lines: ", str(stats.matched))
+        print("Same output: " + str(stats.identical))
+        print("Approximation radius: ", self.config.rounding_tolerance, " consecutive posits")
+        print("Different output, within the radius: " + str(stats.approximated))
+        print("Different output, beyond the radius: " + str(stats.matched - stats.identical - stats.approximated))
+        print("Largest code distance: " + str(stats.max_distance))
+        print("Most lines waiting for their match: " + str(stats.max_pending))
+        print("\n # Code distance from the golden output (lines)")
+        for label, lines in zip(distance_labels(stats.p_size), stats.distances):
+            if lines > 0:
+                print(label + ": " + str(lines))
+        if stats.mismatches:
+            print("\n # Lines with a different output (samples)")
+            for sample in stats.mismatches:
+                print("DUT line " + str(sample[1]) + " of " + sample[0] + " (golden line " + str(sample[2]) + "): "
+                      + " ".join(name + "=" + bits for name, bits in zip(self.operation.operands + ("Out", "Golden"),
+                                                                          sample[3:-1]))
+                      + " distance=" + str(sample[-1]))
+        if stats.orphans:
+            print("\n # Lines without a match (samples)")
+            for sample in stats.orphans:
+                print(sample[1] + " line " + str(sample[2]) + " of " + sample[0] + ": "
+                      + " ".join(name + "=" + bits for name, bits in zip(self.operation.operands + ("Out",),
+                                                                          sample[3:])))
+
+
+# configuration of the command line: options given override the CONFIGURATION section
+def parse_config(argv=None):
+    parser = argparse.ArgumentParser(description="Validate the FMA logs of a folder")
+    parser.add_argument("--path", help="folder containing the .log files")
+    parser.add_argument("--N", type=int, help="bits of the posit format")
+    parser.add_argument("--ES", type=int, help="exponent bits of the posit format")
+    parser.add_argument("--input-type", choices=("bin", "hex"), help="digits of the inputs")
+    parser.add_argument("--output-type", choices=("bin", "hex"), help="digits of the output")
+    parser.add_argument("--rounding-tolerance", type=int, help="consecutive posits accepted as approximation")
+    parser.add_argument("--limit-rows-per-file", type=int, help="max lines per file; -1 to read the whole file")
+    parser.add_argument("--limit-errors-to-display", type=int, help="max error samples; -1 for infinite")
+    parser.add_argument("--reader", choices=("text", "mmap"), help="reader of the text logs")
+    parser.add_argument("--batch-size", type=int, help="lines checked together with NumPy; 0 for one at a time")
+    parser.add_argument("--processes", type=int, help="worker processes; 0 to validate in this process")
+    parser.add_argument("--shard-bytes", type=int, help="size of the byte ranges given to each worker")
+    parser.add_argument("--coordinator", metavar="HOST:PORT", help="hand out the shards to workers connecting here")
+    parser.add_argument("--coordinator-key", help="secret key shared by the coordinator and its workers")
+    parser.add_argument("--local-workers", type=int, help="worker processes started by the coordinator")
+    parser.add_argument("--shard-retries", type=int, help="times a shard is given again after its worker failed")
+    parser.add_argument("--shard-timeout", type=float, help="seconds after which a shard is given to another worker")
+    parser.add_argument("--worker", metavar="HOST:PORT", help="validate the shards handed out by a coordinator")
+    parser.add_argument("--worker-idle", type=float, help="seconds without a coordinator after which a worker stops")
+    parser.add_argument("--checkpoint-file", help="file where the state of the run is saved, to resume it")
+    parser.add_argument("--checkpoint-interval", type=float, help="seconds between two checkpoints")
+    parser.add_argument("--follow", action="store_true", default=None, help="validate the logs while they are written")
+    parser.add_argument("--follow-interval", type=float, help="seconds between two polls of the logs")
+    parser.add_argument("--follow-idle", type=float, help="seconds without new lines after which follow mode ends")
+    parser.add_argument("--max-mistakes", type=int, help="follow mode stops after this many mistakes")
+    parser.add_argument("--profile", action="store_true", default=None, help="measure the stages of the validation")
+    parser.add_argument("--profile-file", help="JSON file where the profile is saved")
+    parser.add_argument("--pipeline", action="store_true", default=None, help="read the logs in background threads")
+    parser.add_argument("--pipeline-block-bytes", type=int, help="bytes read at a time by the pipeline")
+    parser.add_argument("--pipeline-depth", type=int, help="blocks queued between two stages of the pipeline")
+    parser.add_argument("--sink-file", help="JSONL or CSV file where samples of the checked lines are written")
+    parser.add_argument("--sink-limits", nargs="+", metavar="DECISION=LINES",
+                        help="max lines written for some decisions (v, e, a, o, x), e.g. v=1000 a=-1")
+    parser.add_argument("--progress-interval", type=float, help="seconds between two progress messages")
+    parser.add_argument("--memo-size", type=int, help="entries of the caches of decoded values and classifications")
+    parser.add_argument("--result-cache", help="folder where the results of the logs are stored by content hash")
+    parser.add_argument("--hash-block-bytes", type=int, help="bytes hashed at a time")
+    parser.add_argument("--histograms", action="store_true", default=None, help="count the errors in histograms")
+    parser.add_argument("--histogram-file", help="JSON or CSV file where the histograms of the errors are saved")
+    parser.add_argument("--relative-error-range", type=int, nargs=2, metavar=("LOW", "HIGH"),
+                        help="binary exponents of the first and last bucket of relative errors")
+    parser.add_argument("--golden", help="golden log, or folder of golden logs, the logs are compared with")
+    parser.add_argument("--exact-reference", action="store_true", default=None, help="compare with exact results")
+    parser.add_argument("--operation", choices=sorted(operations), help="operation of the logs (see operations.py)")
+    parser.add_argument("--verbose", action="store_true", default=None, help="output every line")
+    parser.add_argument("--quiet", action="store_true", default=None, help="output the report only")
+    args = parser.parse_args(argv)
+    if args.quiet:
+        args.verbose = False
+    if args.coordinator_key is None and coordinator_key is None:
+        if args.worker is not None:
+            parser.error("--worker requires the --coordinator-key of the coordinator")
+        if args.coordinator is not None and not is_loopback(parse_address(args.coordinator)[0]):
+            parser.error("--coordinator out of localhost requires a secret --coordinator-key")
+    if args.profile_file is not None:
+        args.profile = True
+    if args.histogram_file is not None:
+        args.histograms = True
+    if args.sink_limits is not None:
+        limits = dict(sink_limits)
+        for item in args.sink_limits:
+            msg, _, lines = item.partition("=")
+            if msg not in limits or not lines.lstrip("-").isdigit():
+                parser.error("invalid sink limit: " + item)
+            limits[msg] = int(lines)
+        args.sink_limits = limits
+    # returns a ValidatorConfig
+    return ValidatorConfig(**{name: value for name, value in vars(args).items() if value is not None})
 
 
 # ---------------------------------------------------------------
 # ------------------------- MAIN BODY ---------------------------
-for file in files:
-    # read all .log files containing the appropriate size of N
-    if file.__contains__(str(N)):
-        validate_log(file, limit_rows_per_file)
-
-# validation report
-print("\n ========= Analysis completed ========= ")
-print("# Lines read: " + str(Read))
-print("# Discarded lines: " + str(Discarded))
-print("\n # Representable output: ", str(Correct + Mistakes))
-print("Correct results: " + str(Correct))
-print("Mistakes: " + str(Mistakes))
-print("\n # Not representable output: ", str(Approx_ok + Approx_no))
-print("Approximation radius: ", rounding_tolerance, " consecutive posits")
-print("Correctly approximated: " + str(Approx_ok))
-print("Wrongly approximated: " + str(Approx_no))
+if __name__ == "__main__":
+    validator = LogValidator(parse_config())
+    config = validator.config
+    if config.worker is not None:
+        # every shard comes with the configuration of the run of the coordinator
+        validator.message("Worker of ", config.worker)
+        shards_done = run_worker(parse_address(config.worker), config.coordinator_key.encode(), validate_shard,
+                                 config.worker_idle)
+        validator.message("Shards validated: ", shards_done)
+        sys.exit(0)
+    # B, C and Out (and A, for N up to 8) are decoded with lookup tables
+    validator.message("Decode tables ready: ",
+                      warm_decode_tables([(length, config.ES) for length in sorted(set(validator.variable_binary_lens),
+                                                                                   reverse=True)]), " bytes")
+    if config.golden is not None:
+        # differential mode: the outputs are compared with the ones of the golden logs, not with the reference
+        validator.print_differential_report(validator.compare_files(validator.log_files()))
+        sys.exit(0)
+    if config.follow:
+        # running statistics, every time new lines have been validated
+        def publish(stats):
+            if config.show_progress:
+                validator.message("Lines read: ", stats.read, " | Correct: ", stats.correct, " | Mistakes: ",
+                                  stats.mistakes, " | Approximated: ", stats.approx_ok, " | Wrongly approximated: ",
+                                  stats.approx_no, " | Discarded: ", stats.discarded)
+
+        totals = validator.follow_logs(callback=publish)
+    else:
+        # read all .log files containing the appropriate size of N
+        totals = validator.validate_files(validator.log_files())
+    validator.close_sink()
+    validator.print_report(totals)
+    if validator.profile is not None and config.profile_file is not None:
+        validator.save_profile(totals, config.profile_file)
+    if totals.histograms is not None and config.histogram_file is not None:
+        totals.histograms.save(config.histogram_file, operation=config.operation, lines=totals.read)
@@ -1,44 +1,180 @@
-import random
-
-from simplePositLib import *
-
-N = 8
-
-# a = [0.015625, 0.0625, 0.25, 0.5, 0.75, 1, 2, 3, 4, 5, 7, 10]
-# b = [-12, -8, -5, -4, -3, -2, -1.5, -1, -0.5, -0.25, -0.015625]
-
-pospos = "1001000100000100010000010010010010010001000001000100000100100100"
-print(len(pospos))
-print(len(pospos[0:32]))
-print(len(pospos[32:48]))
-print(len(pospos[48:]))
-
-a = 0
-b = 0
-c = 0
-out = 0
-
-# rappresentabili = 30
-# non_rapp = 20
-# with open("input_file.log", "w") as f:
-#    while non_rapp > 0:
-#        out = random.randint(-4, 4)
-#        b = random.randint(-5, 5)
-#        c = random.uniform(-1, 1)
-#        a = out - (b * c)
-
-#        if isRepresentable(a, N, 0) and isRepresentable(b, N, 0) and isRepresentable(c, N, 0):
-#            if isRepresentable(out, N, 0):
-#                if rappresentabili > 0:
-#                    print()
-
-# f.close()
-# f.write()
-
-binary_diff(8,'00000010', "00000010")
-binary_diff(8,'00000001', "00000010")
-binary_diff(8,'00000010', "00000001")
-binary_diff(8,'00000101', "00000011")
-binary_diff(8,'00000110', "00000011")
-
-binary_diff(8,'00001010', "00000011")
+# generator of FMA stimulus (or of another operation of operations.py), with their expected results
+# usage: python generate_input_sequence.py N ES output [--mode exhaustive|stratified] [--count 1000000] [--first 0]
+#                                          [--hex] [--seed 0] [--chunk 1048576] [--cancel-share 0.25] [--operation fma]
+#
+# every vector is a line "i $A$B$C o 1$Out" (A on 2N bits, B, C and Out on N bits), as fma_log_extractor.py reads them
+# Out is the expected result: A + B*C computed exactly and rounded once to the nearest posit (vectorPositLib.fma_posits)
+# other operations write their own operands, with the widths and the exact reference declared in operations.py
+# an output file ending with .plog is written as a packed log (see log_formats.py)
+# modes:
+#   exhaustive  every (A, B, C) triple in order, 2^(4N) vectors (2^32 for N = 8); --first and --count select a slice
+#               of them, so that the space can be split among several runs (up to 60 bits of operands, N up to 15)
+#   stratified  --count random vectors (default for N > 8); every operand is drawn in turn from each stratum of its
+#               format: the special values (0, NaR, +-minpos, +-maxpos, +-1 and its neighbours) and every reachable
+#               (sign, regime, exponent); a share of the A operands is taken close to -B*C, so that the sum cancels
+#               (for the operations whose first operand can cancel the result)
+# vectors are built, computed and written with NumPy a chunk at a time
+import argparse
+import sys
+from time import perf_counter
+
+import numpy as np
+
+from log_formats import format_records, pack_records, packed_extension, write_packed_header
+from operations import get_operation, operations
+from vectorPositLib import decode_posits, encode_posits
+
+# ---------------------------------------------------------------
+# ----------------------- CONFIGURATION -------------------------
+chunk_size = 1 << 20  # vectors built and written at a time
+vector_count = 1000000  # vectors of the stratified mode, and default slice of the exhaustive mode
+cancel_share = 0.25  # share of the stratified vectors whose A is close to -B*C
+
+
+# ---------------------------------------------------------------
+# ------------------------- FUNCTIONS ---------------------------
+# codes of the special values of a format: 0, NaR, +-minpos, +-maxpos, +-1 and the posits next to +-1
+def special_codes(p_size):
+    mask = (1 << p_size) - 1
+    one = 1 << (p_size - 2)
+    positive = [1, (1 << (p_size - 1)) - 1, one - 1, one, one + 1]
+    codes = {0, 1 << (p_size - 1)} | set(positive) | {-code & mask for code in positive}
+    return np.array(sorted(codes), dtype=np.uint64)
+
+
+# strata of the codes of a format different from the special values: every reachable (sign, regime k, exponent)
+def format_strata(p_size, es_size):
+    strata = []
+    for negative in (False, True):
+        for k in range(2 - p_size, p_size - 1):
+            regime_len = k + 2 if k >= 0 else 1 - k
+            # the regime of the largest k takes all the bits, without terminating bit
+            regime = ((1 << (k + 1)) - 1) << 1 if k >= 0 else 1
+            if regime_len > p_size - 1:
+                regime >>= regime_len - (p_size - 1)
+                regime_len = p_size - 1
+            rest = p_size - 1 - regime_len
+            # exponent bits cut by the regime are zeroes
+            cut = max(es_size - rest, 0)
+            for e in range(0, 1 << es_size, 1 << cut):
+                strata.append((negative, regime, rest, e >> cut, max(rest - es_size, 0)))
+    # returns arrays of sign, regime bits, bits after the regime, exponent bits, fraction bits
+    negative, regime, rest, e, frac_len = (np.array(column) for column in zip(*strata))
+    return negative, regime.astype(np.uint64), rest.astype(np.uint64), e.astype(np.uint64), frac_len.astype(np.uint64)
+
+
+# random codes of a format, drawing them from each stratum in turn (special values are a stratum)
+def stratified_codes(count, p_size, es_size, rng):
+    negative, regime, rest, e, frac_len = format_strata(p_size, es_size)
+    specials = special_codes(p_size)
+    # the last stratum holds the special values; strata are drawn the same number of times, in random order
+    stratum = rng.permutation(np.arange(count) % (len(regime) + 1))
+    special = stratum == len(regime)
+    s = stratum[~special]
+    one = np.uint64(1)
+    frac = rng.integers(0, one << frac_len[s], dtype=np.uint64)
+    body = (regime[s] << rest[s]) | (e[s] << frac_len[s]) | frac
+    mask = np.uint64((1 << p_size) - 1)
+    codes = np.empty(count, dtype=np.uint64)
+    codes[~special] = np.where(negative[s], (~body + one) & mask, body)
+    codes[special] = rng.choice(specials, int(np.count_nonzero(special)))
+    # returns an uint64 array of codes
+    return codes
+
+
+# operands of a slice of the exhaustive sequence: A, B and C are the bits of the index of the vector
+def exhaustive_operands(first, count, p_size, widths=(2, 1, 1)):
+    # $widths: the widths of the operands, in multiples of p_size
+    index = np.arange(first, first + count, dtype=np.uint64)
+    operands = []
+    shift = sum(widths) * p_size
+    for width in widths:
+        shift -= width * p_size
+        operands.append((index >> np.uint64(shift)) & np.uint64((1 << (width * p_size)) - 1))
+    # returns the codes of the operands (A, B, C for the FMA)
+    return operands
+
+
+# random operands drawn from the strata of their formats; some A are taken close to -B*C
+def stratified_operands(count, p_size, es_size, rng, share=cancel_share, operation=get_operation("fma")):
+    operands = [stratified_codes(count, width * p_size, es_size, rng) for width in operation.widths]
+    if operation.cancel is None:
+        return operands
+    cancel = np.flatnonzero(rng.random(count) < share)
+    others = [decode_posits(codes[cancel], width * p_size, es_size)
+              for codes, width in zip(operands[1:], operation.widths[1:])]
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        target = operation.cancel(*others)
+    # the posit nearest to -B*C, or one of the two posits before and after it
+    a_size = operation.widths[0] * p_size
+    offset = rng.integers(-2, 3, len(cancel)).astype(np.uint64)
+    operands[0][cancel] = (encode_posits(target, a_size, es_size) + offset) & np.uint64((1 << a_size) - 1)
+    # returns the codes of the operands (A, B, C for the FMA)
+    return operands
+
+
+# ---------------------------------------------------------------
+# ------------------------- MAIN BODY ---------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate FMA stimulus with their expected results")
+    parser.add_argument("N", type=int, help="bits of the posit format")
+    parser.add_argument("ES", type=int, help="exponent bits of the posit format")
+    parser.add_argument("output", help="log to write (a packed log if it ends with " + packed_extension + ")")
+    parser.add_argument("--mode", choices=("exhaustive", "stratified"), help="exhaustive by default for N <= 8")
+    parser.add_argument("--count", type=int, help="vectors to write; the whole space in exhaustive mode")
+    parser.add_argument("--first", type=int, default=0, help="first vector of the exhaustive sequence")
+    parser.add_argument("--hex", action="store_true", help="write hexadecimal digits instead of binary digits")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random generator")
+    parser.add_argument("--chunk", type=int, default=chunk_size, help="vectors built at a time")
+    parser.add_argument("--cancel-share", type=float, default=cancel_share, help="share of A taken close to -B*C")
+    parser.add_argument("--operation", choices=sorted(operations), default="fma", help="operation of the stimulus")
+    args = parser.parse_args()
+    operation = get_operation(args.operation)
+    if not 2 <= args.N <= 32 or max(operation.widths) * args.N > 64:
+        sys.exit("N must be between 2 and 32, and the operands must fit in 64 bits")
+    mode = args.mode or ("exhaustive" if args.N <= 8 else "stratified")
+    if mode == "exhaustive":
+        bits = sum(operation.widths) * args.N
+        if bits > 60:
+            sys.exit("the exhaustive mode is limited to 60 bits of operands (N <= 15 for the FMA)")
+        space = 1 << bits
+        count = space - args.first if args.count is None else min(args.count, space - args.first)
+    else:
+        count = vector_count if args.count is None else args.count
+    packed = args.output.endswith(packed_extension)
+    digit_type = "hex" if args.hex else "bin"
+    if digit_type == "hex" and args.N % 4 != 0:
+        sys.exit("hexadecimal digits need N multiple of 4")
+    rng = np.random.default_rng(args.seed)
+    written = rounded = 0
+    previous = None
+    start = perf_counter()
+    with open(args.output, "wb") as f:
+        if packed:
+            write_packed_header(f, args.N, operation.name)
+        for first in range(0, count, args.chunk):
+            size = min(args.chunk, count - first)
+            if mode == "exhaustive":
+                operands = exhaustive_operands(args.first + first, size, args.N, operation.widths)
+            else:
+                operands = stratified_operands(size, args.N, args.ES, rng, args.cancel_share, operation)
+                # a line equal to the one before it marks the end of a log: repeated vectors are dropped
+                same = np.ones(size, dtype=bool)
+                same[0] = previous is not None and tuple(codes[0] for codes in operands) == previous
+                for codes in operands:
+                    same[1:] &= codes[1:] == codes[:-1]
+                previous = tuple(codes[-1] for codes in operands)
+                operands = [codes[~same] for codes in operands]
+            o, exact = operation.exact_codes(operands, args.N, args.ES)
+            flags = np.full(len(o), ord("1"), dtype=np.uint8)
+            if packed:
+                pack_records(flags, operands + [o], args.N, operation.widths).tofile(f)
+            else:
+                format_records(flags, operands + [o], args.N, digit_type, operation.widths).tofile(f)
+            written += len(o)
+            rounded += len(o) - int(np.count_nonzero(exact))
+    seconds = perf_counter() - start
+    print("Vectors written: ", written, " (", mode, ")")
+    print("Exact results: ", written - rounded, " | Rounded results: ", rounded)
+    print("Time: ", format(seconds, ".2f"), " s, ", format(written / seconds if seconds > 0 else 0, ".0f"),
+          " vectors/s")
@@ -0,0 +1,106 @@
+# generator of posit lookup tables
+# usage: python generate_posit_table.py N ES [--folder table] [--no-csv] [--no-sorted] [--chunk 1048576]
+#
+# for a given format, writes in the table folder:
+#   posit_<N>_<ES>.csv         one row per code, as "code: bits magnitude k sign useed^k 2^e fraction value"
+#   posit_<N>_<ES>_sorted.bin  every real value of the format but NaR, sorted, as little endian float64
+#   posit_<N>_<ES>_codes.bin   the code of each value of the sorted file, as little endian unsigned integers
+# the .bin files can be memory-mapped (simplePositLib.get_representable_numbers does it for the sorted values)
+# codes are decoded with NumPy a chunk at a time, so that large formats are streamed to disk
+import argparse
+import sys
+
+import numpy as np
+
+from vectorPositLib import posit_fields
+
+# ---------------------------------------------------------------
+# ----------------------- CONFIGURATION -------------------------
+table_folder = "table"  # folder containing posit lookup tables
+chunk_size = 1 << 20  # codes decoded at a time
+
+
+# ---------------------------------------------------------------
+# ------------------------- FUNCTIONS ---------------------------
+# smallest unsigned integer type that holds the codes of a format
+def code_type(p_size):
+    return np.dtype(np.min_scalar_type((1 << p_size) - 1)).newbyteorder("<")
+
+
+# numbers are written as integers when possible ("8", not "8.0")
+def format_number(x):
+    if isinstance(x, str):
+        return x
+    text = repr(x)
+    return text[:-2] if text.endswith(".0") else text
+
+
+# compute all the columns of the csv table for an array of codes
+def table_columns(codes, p_size, es_size):
+    negative, k, e, frac_len, f = posit_fields(codes, p_size, es_size)
+    fraction = 1 + np.ldexp(f.astype(np.float64), -frac_len)
+    power = np.ldexp(1.0, e)
+    useed_k = np.ldexp(1.0, k << es_size)
+    value = np.where(negative, -1.0, 1.0) * fraction * power * useed_k
+    # returns k, sign, useed^k, 2^e, fraction, value as arrays
+    return k, np.where(negative, -1, 1), useed_k, power, fraction, value
+
+
+# write the csv table of a format, one chunk of codes at a time
+def write_csv(p_size, es_size, file_name, chunk=chunk_size):
+    size = 1 << p_size
+    nar = 1 << (p_size - 1)
+    body_mask = nar - 1
+    with open(file_name, "w") as f:
+        for first in range(0, size, chunk):
+            codes = np.arange(first, min(first + chunk, size), dtype=np.uint64)
+            columns = [c.tolist() for c in table_columns(codes, p_size, es_size)]
+            rows = []
+            for code, k, s, useed_k, power, fraction, value in zip(codes.tolist(), *columns):
+                magnitude = (-code if code >= nar else code) & body_mask
+                prefix = "-" if code >= nar else ""
+                if code == 0:
+                    useed_k = value = 0.0
+                if code == nar:
+                    useed_k = value = "NaR"
+                rows.append(str(code) + ": " + bin(code)[2:] + " " + prefix + bin(magnitude)[2:] + " " + str(k) + " " +
+                            str(s) + " " + format_number(useed_k) + " " + format_number(power) + " " +
+                            format_number(fraction) + " " + format_number(value) + "\n")
+            f.writelines(rows)
+
+
+# write the sorted values of a format and their codes, one chunk at a time
+def write_sorted(p_size, es_size, values_file, codes_file, chunk=chunk_size):
+    # posits are ordered as the signed integers with the same bits: no sorting is needed
+    half = 1 << (p_size - 1)
+    mask = (1 << p_size) - 1
+    with open(values_file, "wb") as fv, open(codes_file, "wb") as fc:
+        for first in range(1 - half, half, chunk):
+            signed = np.arange(first, min(first + chunk, half), dtype=np.int64)
+            codes = signed.astype(np.uint64) & np.uint64(mask)
+            value = table_columns(codes, p_size, es_size)[5]
+            value[codes == 0] = 0.0
+            value.astype("<f8").tofile(fv)
+            codes.astype(code_type(p_size)).tofile(fc)
+
+
+# ---------------------------------------------------------------
+# ------------------------- MAIN BODY ---------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate lookup tables for a posit format")
+    parser.add_argument("N", type=int, help="bits of the posit format")
+    parser.add_argument("ES", type=int, help="exponent bits of the posit format")
+    parser.add_argument("--folder", default=table_folder, help="destination folder")
+    parser.add_argument("--no-csv", action="store_true", help="do not write the csv table")
+    parser.add_argument("--no-sorted", action="store_true", help="do not write the sorted binary tables")
+    parser.add_argument("--chunk", type=int, default=chunk_size, help="codes decoded at a time")
+    args = parser.parse_args()
+    if not 2 <= args.N <= 64:
+        sys.exit("N must be between 2 and 64")
+    name = args.folder + "/posit_" + str(args.N) + "_" + str(args.ES)
+    if not args.no_csv:
+        write_csv(args.N, args.ES, name + ".csv", args.chunk)
+        print("Written ", name + ".csv")
+    if not args.no_sorted:
+        write_sorted(args.N, args.ES, name + "_sorted.bin", name + "_codes.bin", args.chunk)
+        print("Written ", name + "_sorted.bin", name + "_codes.bin")
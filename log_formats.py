@@ -0,0 +1,209 @@
+# readers and writers of FMA logs, and of the logs of the other operations (see operations.py)
+# ---------------------------------------------------------------
+# text logs have rows like "i $input o $flag$output", with input = {A,B,C} written in binary or hexadecimal digits
+# (the operands of the operation, with their widths: A on 2N bits, B and C on N bits for the FMA)
+# packed logs (.plog) hold the same records as fixed size little endian words:
+#   header:  "PLOG", version (1 byte), N (1 byte), operation code (1 byte, 0 for fma), 1 reserved byte
+#   records: flag (the ASCII code of the text flag), the operands (A on 2N bits, B, C for the FMA), Out (N bits)
+#   every word takes 1, 2, 4 or 8 bytes, the smallest size holding its bits
+# fixed-width text logs can also be memory-mapped, reading their lines as rows of a 2D array (map_text_log)
+# text logs are written from arrays of codes with format_records (see generate_input_sequence.py)
+# usage: python log_formats.py input.log output.plog N [--hex] [--operation fma]
+#   converts a text log in a packed log, a chunk of lines at a time
+import argparse
+from itertools import islice
+from os.path import getsize
+
+import numpy as np
+
+from operations import get_operation, operation_by_code, operations
+from vectorPositLib import bits2codes, codes2bits
+
+# ---------------------------------------------------------------
+# ----------------------- CONFIGURATION -------------------------
+packed_extension = ".plog"  # extension of packed logs
+chunk_lines = 1 << 20  # lines converted at a time
+# ------------------------- PARAMETERS --------------------------
+PACKED_MAGIC = b"PLOG"
+PACKED_VERSION = 1
+PACKED_HEADER_SIZE = 8
+
+
+# ---------------------------------------------------------------
+# ------------------------- FUNCTIONS ---------------------------
+# number of digits of the operands (A, B, C for the FMA) and of Out, and bits per digit, for a posit size, a digit
+# type ("bin" or "hex") and the widths of the operands in multiples of N (see operations.py)
+def digit_sizes(p_size, digit_type="bin", widths=(2, 1, 1)):
+    digit_bits = 4 if digit_type == "hex" else 1
+    n = p_size // digit_bits
+    return tuple(width * n for width in widths) + (n, digit_bits)
+
+
+# convert lines of a text log, as rows of a 2D array of characters, in arrays of codes
+def parse_records(buf, *sizes):
+    # $buf: uint8 array with one line per row, without line terminator; all lines must have the same width
+    # $sizes: number of digits of each operand and of Out, then bits per digit (1 for binary digits, 4 for
+    #         hexadecimal digits), as digit_sizes returns them
+    lengths, digit_bits = sizes[:-1], sizes[-1]
+    in_len = sum(lengths[:-1])
+    rows = buf.shape[0]
+    if buf.shape[1] != in_len + lengths[-1] + 6:
+        return (np.zeros(rows, dtype=bool), None) + (None,) * len(lengths)
+    valid = ((buf[:, 0] == ord("i")) & np.all(buf[:, [1, in_len + 2, in_len + 4]] == ord(" "), axis=1)
+             & (buf[:, in_len + 3] == ord("o")) & (buf[:, in_len + 5] != ord(" ")))
+    digit_values = np.full(256, 255, dtype=np.uint8)
+    digit_values[[ord(d) for d in "01"]] = [0, 1]
+    if digit_bits == 4:
+        digit_values[[ord(d) for d in "0123456789abcdef"]] = range(16)
+        digit_values[[ord(d) for d in "ABCDEF"]] = range(10, 16)
+    digits = digit_values[np.concatenate((buf[:, 2:in_len + 2], buf[:, in_len + 6:]), axis=1)]
+    valid &= ~np.any(digits == 255, axis=1)
+    codes = []
+    column = 0
+    for length in lengths:
+        codes.append(bits2codes(digits[:, column:column + length], digit_bits))
+        column += length
+    # returns which rows follow the layout, the flags (as ASCII codes) and the codes of the operands and of Out
+    return (valid, buf[:, in_len + 5]) + tuple(codes)
+
+
+# convert arrays of flags and codes in lines of a text log, as rows of a 2D array of characters (terminator included)
+def format_records(flags, codes, p_size, digit_type="bin", widths=(2, 1, 1)):
+    # $flags: the flags of the lines, as ASCII codes
+    # $codes: the arrays of codes of the operands (A on 2N bits, B, C on N bits for the FMA) and of Out (N bits)
+    # $widths: the widths of the operands, in multiples of N
+    *lengths, digit_bits = digit_sizes(p_size, digit_type, widths)
+    in_len = sum(lengths[:-1])
+    buf = np.empty((len(flags), in_len + lengths[-1] + 7), dtype=np.uint8)
+    digit_chars = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+    buf[:, 0] = ord("i")
+    buf[:, 1] = ord(" ")
+    column = 2
+    for operand, length in zip(codes[:-1], lengths[:-1]):
+        buf[:, column:column + length] = digit_chars[codes2bits(operand, length, digit_bits)]
+        column += length
+    buf[:, column:column + 3] = np.frombuffer(b" o ", dtype=np.uint8)
+    buf[:, column + 3] = flags
+    buf[:, column + 4:-1] = digit_chars[codes2bits(codes[-1], lengths[-1], digit_bits)]
+    buf[:, -1] = ord("\n")
+    # returns an uint8 array with one line per row
+    return buf
+
+
+# little endian unsigned type holding a number of bits
+def word_type(bits):
+    for size in (1, 2, 4, 8):
+        if bits <= size * 8:
+            return np.dtype("<u" + str(size))
+    raise ValueError("words larger than 64 bits are not supported")
+
+
+# type of the records of a packed log: the operands are the fields "a", "b", "c"... in the order of the text logs
+def record_type(p_size, widths=(2, 1, 1)):
+    return np.dtype([("flag", "u1")] + [(name, word_type(width * p_size)) for name, width in zip("abcdefgh", widths)]
+                    + [("out", word_type(p_size))])
+
+
+# write the header of a packed log
+def write_packed_header(f, p_size, operation="fma"):
+    f.write(PACKED_MAGIC + bytes([PACKED_VERSION, p_size, get_operation(operation).code, 0]))
+
+
+# map the records of a packed log in memory, without reading them
+def read_packed(file_name):
+    with open(file_name, "rb") as f:
+        header = f.read(PACKED_HEADER_SIZE)
+    if len(header) != PACKED_HEADER_SIZE or header[:4] != PACKED_MAGIC or header[4] != PACKED_VERSION:
+        raise ValueError(file_name + " is not a packed log")
+    p_size = header[5]
+    operation = operation_by_code(header[6])
+    dtype = record_type(p_size, operation.widths)
+    count, trailing = divmod(getsize(file_name) - PACKED_HEADER_SIZE, dtype.itemsize)
+    if count == 0:
+        records = np.zeros(0, dtype=dtype)
+    else:
+        records = np.memmap(file_name, dtype=dtype, mode="r", offset=PACKED_HEADER_SIZE, shape=(count,))
+    # returns N, the name of the operation, the records, and the number of bytes of an incomplete last record
+    return p_size, operation.name, records, trailing
+
+
+# build the packed records of arrays of flags and codes
+def pack_records(flags, codes, p_size, widths=(2, 1, 1)):
+    # $codes: the arrays of codes of the operands and of Out, as format_records takes them
+    records = np.empty(len(flags), dtype=record_type(p_size, widths))
+    records["flag"] = flags
+    for name, operand in zip(records.dtype.names[1:], codes):
+        records[name] = operand
+    return records
+
+
+# map a text log in memory as a 2D array of characters, one line per row, without copying it
+def map_text_log(file_name):
+    with open(file_name, "rb") as f:
+        first = f.readline()
+    width = len(first.rstrip())
+    if not first.endswith(b"\n"):
+        # a single line without terminator
+        return np.zeros((0, width), dtype=np.uint8), first, False
+    # every line takes the same bytes of the first one, terminator included
+    stride = len(first)
+    data = np.memmap(file_name, dtype=np.uint8, mode="r")
+    count = len(data) // stride
+    rows = data[:count * stride].reshape(count, stride)
+    # a line of different length moves the terminators of the following rows
+    broken = np.flatnonzero(rows[:, stride - 1] != ord("\n"))
+    if len(broken) > 0:
+        return rows[:broken[0], :width], b"", True
+    # returns the rows, the last line if it has no terminator, and True if a line breaks the fixed width layout
+    return rows[:, :width], bytes(data[count * stride:]), False
+
+
+# convert a text log in a packed log; conversion stops at the first line not following the layout
+def convert_text_log(input_file, output_file, p_size, digit_type="bin", chunk=chunk_lines, operation="fma"):
+    widths = get_operation(operation).widths
+    sizes = digit_sizes(p_size, digit_type, widths)
+    width = sum(sizes[:-1]) + 6
+    converted = 0
+    stop = None
+    with open(input_file, "r") as fin, open(output_file, "wb") as fout:
+        write_packed_header(fout, p_size, operation)
+        while stop is None:
+            lines = [line.rstrip() for line in islice(fin, chunk)]
+            if not lines:
+                break
+            # lines of a different width (e.g. an incomplete last line) end the conversion
+            for i, line in enumerate(lines):
+                if len(line) != width:
+                    lines = lines[:i]
+                    stop = converted + i
+                    break
+            if not lines:
+                break
+            buf = np.frombuffer("".join(lines).encode("ascii", "replace"), dtype=np.uint8).reshape(len(lines), width)
+            valid, flags, *codes = parse_records(buf, *sizes)
+            if not np.all(valid):
+                first_invalid = int(np.argmin(valid))
+                stop = converted + first_invalid
+                valid[first_invalid:] = False
+            pack_records(flags[valid], [column[valid] for column in codes], p_size, widths).tofile(fout)
+            converted += int(np.count_nonzero(valid))
+    # returns the number of records written, and the index of the first line not converted (None if all were)
+    return converted, stop
+
+
+# ---------------------------------------------------------------
+# ------------------------- MAIN BODY ---------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert a text FMA log in a packed log")
+    parser.add_argument("input", help="text log")
+    parser.add_argument("output", help="packed log to write")
+    parser.add_argument("N", type=int, help="bits of the posit format")
+    parser.add_argument("--hex", action="store_true", help="the text log is written with hexadecimal digits")
+    parser.add_argument("--chunk", type=int, default=chunk_lines, help="lines converted at a time")
+    parser.add_argument("--operation", choices=sorted(operations), default="fma", help="operation of the log")
+    args = parser.parse_args()
+    written, first_skipped = convert_text_log(args.input, args.output, args.N, "hex" if args.hex else "bin",
+                                              args.chunk, args.operation)
+    print("Records written: ", written)
+    if first_skipped is not None:
+        print("Conversion stopped at line ", first_skipped + 1, ": it does not follow the log layout")
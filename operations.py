@@ -0,0 +1,124 @@
+# operations whose logs can be validated, with their references
+# ---------------------------------------------------------------
+# a log line holds the operands of an operation and its output: "i $input o $flag$output"
+# every operation declares:
+#   operands     names of its operands, in the order they are written in $input
+#   widths       bits of each operand, in multiples of N (the output always has N bits)
+#   value        the real result from the real values of the operands, for floats and NumPy arrays alike;
+#                it is the reference of the float check
+#   exact        the result from the operand codes (a tuple of integers), computed exactly and rounded once;
+#                returns (code, True if exact), and it is the reference of the exact check
+#   exact_codes  the same for a list of uint64 arrays of codes, returning arrays; used by the batch mode
+#   terms        the expected result as shown in the console for a line, e.g. (A, " + ", B*C)
+#   cancel       the value of the first operand cancelling the result, from the values of the other ones, used by
+#                generate_input_sequence.py; None if the first operand cannot cancel the result
+#   code         number of the operation in the header of packed logs (0 is fma, as in the logs written before)
+# every result is rounded once to the nearest posit: ties to even, saturating to minpos/maxpos (never to zero or
+# NaR); NaR operands and division by zero give NaR
+# usage:
+#   operation = get_operation("div")
+#   code, exact = operation.exact((a, b), N, ES)
+#   register_operation(Operation(...))  # an operation registered before the validator starts can be checked too
+from simplePositLib import posit_div, posit_dot, posit_fma
+
+try:
+    import numpy as np
+    from vectorPositLib import div_posits, dot_posits, fma_posits
+except ImportError:  # exact_codes requires NumPy
+    np = None
+
+# ---------------------------------------------------------------
+# ------------------------- PARAMETERS --------------------------
+# registered operations, by name
+operations = {}
+
+
+# ---------------------------------------------------------------
+# ------------------------- FUNCTIONS ---------------------------
+# an operation of the log, and its references
+class Operation:
+    def __init__(self, name, code, operands, widths, value, exact, exact_codes, terms, cancel=None):
+        self.name = name
+        self.code = code
+        self.operands = operands
+        self.widths = widths
+        self.value = value
+        self.exact = exact
+        self.exact_codes = exact_codes
+        self.terms = terms
+        self.cancel = cancel
+
+
+# make an operation available by its name
+def register_operation(operation):
+    if any(other.code == operation.code and other.name != operation.name for other in operations.values()):
+        raise ValueError("packed log code already used: " + str(operation.code))
+    operations[operation.name] = operation
+    # returns the operation
+    return operation
+
+
+# registered operation with a name
+def get_operation(name):
+    if name not in operations:
+        raise ValueError("unknown operation: " + name + " (available: " + ", ".join(sorted(operations)) + ")")
+    return operations[name]
+
+
+# registered operation with a packed log code
+def operation_by_code(code):
+    for operation in operations.values():
+        if operation.code == code:
+            return operation
+    raise ValueError("unknown operation code: " + str(code))
+
+
+# A / B, NaN when B is zero (the expected result is NaR)
+def quotient(a, b):
+    if np is not None and isinstance(b, np.ndarray):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(b != 0, a / b, np.nan)
+    return a / b if b != 0 else float("nan")
+
+
+# codes of 0 and 1 in an array as long as the arrays of codes
+def constant_codes(codes, code):
+    return np.full(len(codes[0]), code, dtype=np.uint64)
+
+
+register_operation(Operation(
+    "fma", 0, ("A", "B", "C"), (2, 1, 1),
+    value=lambda a, b, c: a + b * c,
+    exact=lambda codes, p_size, es_size: posit_fma(*codes, p_size, es_size, 2 * p_size),
+    exact_codes=lambda codes, p_size, es_size: fma_posits(*codes, p_size, es_size, 2 * p_size),
+    terms=lambda a, b, c: (a, " + ", b * c),
+    cancel=lambda b, c: -(b * c)))
+# A + B is the fma A + B*1, and A*B is the fma 0 + A*B
+register_operation(Operation(
+    "add", 1, ("A", "B"), (1, 1),
+    value=lambda a, b: a + b,
+    exact=lambda codes, p_size, es_size: posit_fma(*codes, 1 << (p_size - 2), p_size, es_size),
+    exact_codes=lambda codes, p_size, es_size: fma_posits(*codes, constant_codes(codes, 1 << (p_size - 2)), p_size,
+                                                          es_size),
+    terms=lambda a, b: (a, " + ", b),
+    cancel=lambda b: -b))
+register_operation(Operation(
+    "mul", 2, ("A", "B"), (1, 1),
+    value=lambda a, b: a * b,
+    exact=lambda codes, p_size, es_size: posit_fma(0, *codes, p_size, es_size),
+    exact_codes=lambda codes, p_size, es_size: fma_posits(constant_codes(codes, 0), *codes, p_size, es_size),
+    terms=lambda a, b: (a, " * ", b)))
+register_operation(Operation(
+    "div", 3, ("A", "B"), (1, 1),
+    value=quotient,
+    exact=lambda codes, p_size, es_size: posit_div(*codes, p_size, es_size),
+    exact_codes=lambda codes, p_size, es_size: div_posits(*codes, p_size, es_size),
+    terms=lambda a, b: (a, " / ", b)))
+# dot product of two pairs, accumulated without rounding as in a quire
+register_operation(Operation(
+    "dot", 4, ("A", "B", "C", "D"), (1, 1, 1, 1),
+    value=lambda a, b, c, d: a * b + c * d,
+    exact=lambda codes, p_size, es_size: posit_dot(codes[0::2], codes[1::2], p_size, es_size),
+    exact_codes=lambda codes, p_size, es_size: dot_posits(*codes, p_size, es_size),
+    terms=lambda a, b, c, d: (a * b, " + ", c * d),
+    cancel=lambda b, c, d: quotient(-(c * d), b)))
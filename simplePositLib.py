@@ -1,5 +1,12 @@
 # ---------------------------------------------------------------
+import sys
+from array import array
+from bisect import bisect_left
+from fractions import Fraction
+from math import frexp, isinf, isnan, ldexp
+from mmap import ACCESS_READ, mmap
 from os import listdir
+from os.path import getsize, isfile
 
 # ---------------------------------------------------------------
 # Simple python library for some posit operations
@@ -26,22 +33,57 @@ from os import listdir
 #   >> bit2fraction(bits):
 #       calculate the fractional part of a posit
 #
+#   >> decode_posit(code, p_size=8, es_size=0):
+#       convert a posit encoded as an integer in a real number, using only integer operations and a single ldexp
+#       any p_size up to 64 and any es_size are supported
+#
+#   >> split_posit(code, p_size=8, es_size=0):
+#       split a posit encoded as an integer in a mantissa m and a scale, so that its value is exactly m * 2^scale
+#
 #   >> posit2real(bits, p_size=8, es_size=0):
-#       convert a string of bits representing a Posit number in a real number
-#       TODO: this feature is not implemented yet for exponents different than 0
+#       convert a Posit number in a real number; bits can be a string of bits or an integer code
+#
+#   >> string2real(bits, p_size=8, es_size=0):
+#       the original character by character decoder, used for strings whose length differs from p_size
+#
+#   >> get_decode_table(p_size, es_size):
+#       return the lookup table holding the real value of every code of a format with p_size <= max_table_bits
+#       tables are built on first use, and read from/written to table_folder as .bin files if enabled
+#
+#   >> lookup_posit(code, p_size=8, es_size=0):
+#       convert a posit encoded as an integer in a real number, with a table lookup when the format allows it
+#
+#   >> warm_decode_tables(formats):
+#       build in advance the lookup tables of a list of (p_size, es_size) formats
+#
+#   >> decode_tables_memory():
+#       number of bytes used by the lookup tables built so far
 #
 #   >> hex2bit(hex_in, expected_len):
 #       convert a string representing a hexadecimal number in a binary number, having a given expected length
 #
-# function:
-#   >> real2posit(real: float, p_size, es_size):
-#       convert a real number in a string of bit representing a posit
-#       TODO: this is just a quick attempt left unfinished; it is not working correctly
+#   >> split_real(real, p_size=8):
+#       split a float, int or Fraction in an integer mantissa m and a scale, so that it is m * 2^scale
+#
+#   >> encode_posit(real, p_size=8, es_size=0):
+#       convert a float, int or Fraction in the code of the nearest posit (ties to even, saturating)
+#       NaN and infinities are converted to NaR
+#
+#   >> real2posit(real, p_size, es_size):
+#       convert a real number in a string of bit representing a posit (see encode_posit)
+#
+#   >> get_representable_numbers(p_size, es_size):
+#       sorted array with all the real values of a format up to max_table_bits (NaR excluded), loaded once
+#       from table_folder/posit_<N>_<ES>_sorted.bin (memory-mapped), written by generate_posit_table.py; if it does
+#       not exist, or its size or some of its values differ from the decoder ones, the array is built from the decode
+#       table
 #
 #   >> isRepresentable(num, p_size, es_size):
-#       check if a number is posit_representable.
-#       TODO: this feature rely on lookup tables, saved in files for given formats.
-#           if the real2posit function is ever finished, it can replace the use of lookup tables
+#       check if a number is posit_representable, with a binary search in the sorted values of the format
+#       wider formats are checked rounding the number with exact2posit
+#
+#   >> representable_neighbours(num, p_size, es_size):
+#       the nearest representable numbers below and above a number (both equal to it if it is representable)
 #
 #   >> binary_sum(max_size, b1, b2):
 #       calculate additions between binary numbers. operands and result are encoded as strings
@@ -49,16 +91,42 @@ from os import listdir
 #   >> binary_diff(max_size, b1, b2):
 #       calculate subtractions between binary numbers. operands and result are encoded as strings
 #
+#   >> twos_complement(code, p_size=8), modular_sum(a, b, p_size=8), modular_diff(a, b, p_size=8):
+#       the same operations of a2comp, binary_sum and binary_diff on integers, modulo 2^p_size
+#
+#   >> posit_neighbours(code, steps=1, p_size=8):
+#       the codes of the posits some steps below and above a posit
+#
+#   >> exact2posit(m, scale, p_size=8, es_size=0):
+#       round the number m * 2^scale to the nearest posit code (ties to even, saturating to minpos/maxpos)
+#
+#   >> posit_fma(a, b, c, p_size=8, es_size=0, a_size=None):
+#       compute A + B*C with integer arithmetic from the codes of the operands, rounding only once
+#
+#   >> posit_div(a, b, p_size=8, es_size=0):
+#       compute A / B from the codes of the operands, rounding the exact quotient only once (B = 0 gives NaR)
+#
+#   >> posit_dot(xs, ys, p_size=8, es_size=0):
+#       compute the sum of the products xs[i] * ys[i] exactly, as a quire would do, rounding it only once
+#
+#   >> code_distance(p1, p2, p_size=8):
+#       distance between two posit codes, counting the posits that separate them
+#
 # ---------------------------------------------------------------
 # ---------------------------------------------------------------
 # ------------------- config parameters: ------------------------
 table_folder = "table"  # folder containing posit lookup tables
 
-# cache_max_size -1 is unlimited; cache_max_size 0 is to remove this feature
-cache_max_size = -1
+# formats up to this size are decoded with a lookup table (2^16 codes -> 512 KiB per table)
+max_table_bits = 16
+# read and write decode tables as table_folder/posit_<N>_<ES>.bin, to avoid building them at every run
+store_decode_tables = False
 # ------------------ internal variables: ------------------------
-# in order to avoid closing and opening the file several times, the numbers read in there are saved in a local array
-representable_numbers_cache = []
+# in order to avoid reading the lookup table files several times, their numbers are kept sorted in memory
+# indexed by (p_size, es_size)
+representable_numbers = {}
+# decode tables already in memory, indexed by (p_size, es_size)
+decode_tables = {}
 
 
 # ---------------------------------------------------------------
@@ -68,18 +136,15 @@ def a2comp(bits, expected_len=8):
     # $ parameters $
     # $bits: a steam of (0,1), representing bits to be complemented
     # $expected_len: number of bits of the output; zero padding is applied if necessary
-    complement = ""
-    i = 0
-    reduced = bin(int(bits, 2) - 1)[2:].zfill(expected_len)
-    for bit in reduced:
-        if bit == '0':
-            complement += '1'
-        else:
-            complement += '0'
-        i += 1
-    converted = bin(int(complement, 2))
+    size = max(expected_len, len(bits))
     # returns the A2 complement represented on the desired number of bits
-    return converted[2:].zfill(expected_len)
+    return format(twos_complement(int(bits or "0", 2), size), "0" + str(size) + "b")
+
+
+# function: compute 2's complement of an integer of p_size bits
+def twos_complement(code, p_size=8):
+    # returns -code modulo 2^p_size
+    return -code & ((1 << p_size) - 1)
 
 
 # function: compute the sign of a function
@@ -132,8 +197,77 @@ def bit2fraction(bits):
     return f
 
 
+# function: split a posit encoded as an integer in an integer mantissa and a power of two
+def split_posit(code, p_size=8, es_size=0):
+    # $ parameters $
+    # $code: the posit as an unsigned integer of p_size bits (higher bits are ignored)
+    # $p_size: the number of bits on which the number $code is represented
+    # $es_size: the number of bits reserved for the posit exponent
+    mask = (1 << p_size) - 1
+    code &= mask
+    if code == 0:
+        return 0, 0
+    s = 1
+    if code >> (p_size - 1):
+        s = -1
+        code = -code & mask
+    # bits after the sign; NaR (10..0) keeps an empty body, as the string decoder did
+    body_len = p_size - 1
+    body = code & (mask >> 1)
+    # the regime is the run of identical bits at the head of the body
+    if body >> (body_len - 1):
+        run = body_len - (~body & (mask >> 1)).bit_length()
+        k = run - 1
+    else:
+        run = body_len - body.bit_length()
+        k = -run
+    # skip the regime and its terminating bit; what is left holds exponent and fraction
+    rest_len = body_len - run - 1
+    if rest_len < 0:
+        rest_len = 0
+    rest = body & ((1 << rest_len) - 1)
+    if rest_len >= es_size:
+        frac_len = rest_len - es_size
+        e = rest >> frac_len
+        f = rest & ((1 << frac_len) - 1)
+    else:
+        # exponent bits cut by the regime are zeroes
+        frac_len = 0
+        e = rest << (es_size - rest_len)
+        f = 0
+    # returns m and scale, so that the posit is exactly m * 2^scale: (1.f) * 2^e * useed^k
+    return s * ((1 << frac_len) | f), (k << es_size) + e - frac_len
+
+
+# function: convert a posit encoded as an integer in a real number
+def decode_posit(code, p_size=8, es_size=0):
+    # $ parameters $
+    # $code: the posit as an unsigned integer of p_size bits (higher bits are ignored)
+    # $p_size: the number of bits on which the number $code is represented
+    # $es_size: the number of bits reserved for the posit exponent
+    m, scale = split_posit(code, p_size, es_size)
+    # returns the real signed number
+    return ldexp(m, scale)
+
+
 # function: convert a string of bits representing a Posit number in a real number
 def posit2real(bits, p_size=8, es_size=0):
+    # $ parameters $
+    # $bits: a string of bits representing a posit, or the posit as an integer code
+    # $p_size: the number of bits on which the number $bits is represented
+    # $es_size: the number of bits reserved for the posit exponent
+    if not isinstance(bits, str):
+        return decode_posit(bits, p_size, es_size)
+    if len(bits) == p_size:
+        return decode_posit(int(bits, 2), p_size, es_size)
+    # strings not matching p_size are read the way the original string decoder did
+    return string2real(bits, p_size, es_size)
+
+
+# function: convert a string of bits in a real number, walking the string character by character
+# kept for strings whose length differs from p_size: the first p_size characters hold sign and regime,
+# while exponent and fraction run until the end of the string
+def string2real(bits, p_size=8, es_size=0):
     # $ parameters $
     # $bits: a string of bits representing a posit
     # $p_size: the number of bits on which the number $bits is represented
@@ -159,6 +293,72 @@ def posit2real(bits, p_size=8, es_size=0):
     return s * f * pow(2, e) * pow(pow(2, pow(2, es_size)), k)
 
 
+# function: get the lookup table with the real value of every code of a posit format
+def get_decode_table(p_size, es_size):
+    # $ parameters $
+    # $p_size: the number of bits of the posit format (must not exceed max_table_bits)
+    # $es_size: the number of bits reserved for the posit exponent
+    table = decode_tables.get((p_size, es_size))
+    if table is not None:
+        return table
+    if p_size > max_table_bits:
+        raise ValueError("no decode table for " + str(p_size) + " bit posits; max_table_bits is " +
+                         str(max_table_bits))
+    size = 1 << p_size
+    file_name = table_folder + "/posit_" + str(p_size) + "_" + str(es_size) + ".bin"
+    table = array('d')
+    # tables are saved as little endian float64, one value per code
+    if store_decode_tables and isfile(file_name) and getsize(file_name) == size * table.itemsize:
+        with open(file_name, "rb") as f:
+            table.fromfile(f, size)
+        if sys.byteorder == "big":
+            table.byteswap()
+    else:
+        table.extend(decode_posit(code, p_size, es_size) for code in range(size))
+        if store_decode_tables:
+            stored = array('d', table)
+            if sys.byteorder == "big":
+                stored.byteswap()
+            with open(file_name, "wb") as f:
+                stored.tofile(f)
+    decode_tables[(p_size, es_size)] = table
+    # returns an array('d') with 2^p_size values
+    return table
+
+
+# function: convert a posit encoded as an integer in a real number, using the lookup table if possible
+def lookup_posit(code, p_size=8, es_size=0):
+    # $ parameters $
+    # $code: the posit as an unsigned integer of p_size bits
+    # $p_size: the number of bits on which the number $code is represented
+    # $es_size: the number of bits reserved for the posit exponent
+    table = decode_tables.get((p_size, es_size))
+    if table is None:
+        if p_size > max_table_bits:
+            # wider formats (e.g. the 2N bits addend) are decoded arithmetically
+            return decode_posit(code, p_size, es_size)
+        table = get_decode_table(p_size, es_size)
+    # returns the real signed number
+    return table[code]
+
+
+# function: build in advance the decode tables of some posit formats
+def warm_decode_tables(formats):
+    # $ parameters $
+    # $formats: iterable of (p_size, es_size) pairs; formats wider than max_table_bits are skipped
+    for p_size, es_size in formats:
+        if p_size <= max_table_bits:
+            get_decode_table(p_size, es_size)
+    # returns the memory used by all tables in memory, in bytes
+    return decode_tables_memory()
+
+
+# function: compute the memory used by the decode tables
+def decode_tables_memory():
+    # returns the number of bytes allocated for table values
+    return sum(len(t) * t.itemsize for t in decode_tables.values())
+
+
 # function: convert a string representing a hexadecimal number in a binary number
 def hex2bit(hex_in, expected_len):
     # $ parameters $
@@ -168,113 +368,79 @@ def hex2bit(hex_in, expected_len):
     return bin(int(hex_in, 16))[2:].zfill(expected_len)
 
 
-# TODO: NOT WORKING FOR NEGATIVE NUMBERS
+# function: split a real number in an integer mantissa m and a scale, so that it is m * 2^scale
+def split_real(real, p_size=8):
+    # $ parameters $
+    # $real: float, int or Fraction (finite)
+    # $p_size: the number of bits of the posit format the number will be rounded to
+    if isinstance(real, int):
+        return real, 0
+    if isinstance(real, Fraction):
+        n, d = real.numerator, real.denominator
+        if d & (d - 1) == 0:
+            return n, 1 - d.bit_length()
+        # the quotient has more bits than any posit of p_size bits can keep; a last sticky bit
+        # set if the division has a remainder makes the rounding the same as for the exact number
+        shift = max(0, p_size + 3 - (abs(n).bit_length() - d.bit_length()))
+        q, r = divmod(abs(n) << shift, d)
+        m = (q << 1) | (r != 0)
+        return (-m if n < 0 else m), -shift - 1
+    m, e = frexp(real)
+    # returns the mantissa and the scale; the 53 bits of a double are kept as they are
+    return int(ldexp(m, 53)), e - 53
+
+
+# function: convert a real number in the code of the nearest posit
+def encode_posit(real, p_size=8, es_size=0):
+    # $ parameters $
+    # $real: float, int or Fraction to be converted
+    # $p_size: the number of bits of the posit format
+    # $es_size: the number of bits reserved for the posit exponent
+    if isinstance(real, float) and (isnan(real) or isinf(real)):
+        return 1 << (p_size - 1)
+    # returns the code (ties to even; saturating to minpos/maxpos, never rounding to zero or NaR)
+    return exact2posit(*split_real(real, p_size), p_size, es_size)[0]
+
+
 # function: convert a real number in a string of bit representing a posit
-def real2posit(real: float, p_size, es_size):
+def real2posit(real, p_size, es_size):
     # $ parameters $
-    # $real: [float] real number to be converted
+    # $real: float, int or Fraction to be converted
     # $p_size: the number of bits on which the number $bits is represented
     # $es_size: the number of bits reserved for the posit exponent
-    if real == 0:
-        return 0, -p_size + 1, 1, 1
-    p_bit = [0] * p_size
-    r_bit = []
-    fraction_bit = []
-    e = 1
-    s = 0
-    f = 0
-    if real < 0:
-        s = 1
-    k = 0
-
-    # calculate K
-    if real > 0:
-        if real > 1:
-            while pow(pow(2, pow(2, es_size)), k + 1) <= real:
-                k += 1
-        else:  # real in [0,1]
-            while pow(pow(2, pow(2, es_size)), k) > real:
-                k -= 1
-    else:
-        if real < -1:
-            while -pow(pow(2, pow(2, es_size)), k + 1) >= real:
-                k += 1
-        else:  # real in [-1,0]
-            while -pow(pow(2, pow(2, es_size)), k) < real:
-                k -= 1
-
-    # calculate exponent
-    # real /= pow(2, e)
-
-    # calculate fractional part
-    f = abs(real) / pow(pow(2, pow(2, es_size)), k)
-    fraction = f
-
-    # convert fraction to binary
-    for i in range(p_size - len(r_bit) - es_size):
-        if fraction == 0:
-            break
-        if fraction >= pow(2, -i):
-            fraction_bit += [1]
-            fraction -= pow(2, -i)
-        else:
-            fraction_bit += [0]
+    # returns the nearest posit as a binary string of p_size bits (see encode_posit)
+    return format(encode_posit(real, p_size, es_size), "0" + str(p_size) + "b")
 
-    # padding
-    while len(fraction_bit) + es_size + len(r_bit) < p_size:
-        fraction_bit += [0]
 
-        # build regime
-    if real > 0:
-        if k >= 0:
-            for _ in range(k + 1):
-                r_bit += [1]
-        else:  # k < 0
-            for _ in range(-k):
-                r_bit += [0]
-    else:
-        # real < 0:
-        if k > 0:
-            for _ in range(k + 1):
-                r_bit += [0]
-        else:  # k < 0
-            for _ in range(-k):
-                r_bit += [1]
-            if k == 0:
-                r_bit = [1]
-
-        # regime terminal bit
-    if r_bit[0] == 0:
-        r_bit += [1]
+# get the sorted list of the numbers that a posit format can represent
+def get_representable_numbers(p_size, es_size):
+    # $ parameters $
+    # $p_size: the number of bits of the posit format (must not exceed max_table_bits)
+    # $es_size: the number of bits reserved for the posit exponent
+    numbers = representable_numbers.get((p_size, es_size))
+    if numbers is not None:
+        return numbers
+    sorted_file = table_folder + "/posit_" + str(p_size) + "_" + str(es_size) + "_sorted.bin"
+    table = get_decode_table(p_size, es_size)
+    half = 1 << (p_size - 1)
+    count = 2 * half - 1
+    if isfile(sorted_file) and sys.byteorder == "little" and getsize(sorted_file) == count * 8:
+        # values already sorted by generate_posit_table.py: map the file instead of reading it
+        with open(sorted_file, "rb") as f:
+            numbers = memoryview(mmap(f.fileno(), 0, access=ACCESS_READ)).cast('d')
+        # the i-th value is the one of the signed code i - (half - 1): a file written for another format (or by an
+        # older generator) is not used; the ends, the values around zero and the middle ones are compared
+        checked = {0, 1, half - 2, half - 1, half, count - 2, count - 1, half // 2, count - half // 2}
+        if any(numbers[i] != table[(i - half + 1) % (2 * half)] for i in checked if 0 <= i < count):
+            numbers = None
     else:
-        r_bit += [0]
-
-        # negative numbers have k increased for 2^n
-    if real < 0:
-        if real == -pow(2, k):
-            r_bit = r_bit[1:]
-
-    # assemble the posit
-    for i in range(p_size):
-        if i > len(r_bit) + es_size:  # write fraction
-            # first bit of fraction_bit is always 0, must be skipped
-            p_bit[i] = fraction_bit[i - (len(r_bit) + es_size)]
-        # if i > len(r_bit) :
-        # write exponent
-
-        else:
-            if i > 0:  # write regime
-                p_bit[i] = r_bit[i - 1]
-            else:
-                p_bit[0] = s  # write sign
-
-    # convert array to string
-    p_out = ""
-    for b in p_bit:
-        p_out += str(b)
-    # returns the number as a binary string encoded in posit, and the parts to make it
-    # remember to store the function result as posit,_,_,_ if you don't need the extra stuff
-    return [[p_out], [s], [r_bit], [fraction_bit]], k, f, e
+        numbers = None
+    if numbers is None:
+        # posits are ordered as the signed integers with the same bits: from -maxpos to maxpos, NaR excluded
+        numbers = table[half + 1:] + table[:half]
+    representable_numbers[(p_size, es_size)] = numbers
+    # returns an array('d') (or a memoryview on the mapped file) sorted in increasing order
+    return numbers
 
 
 # check if a number is posit_representable using a lookup table
@@ -283,79 +449,213 @@ def isRepresentable(num, p_size, es_size):
     # $num: float number that should be checked if representable
     # $p_size: the number of bits on which the number $bits is represented
     # $es_size: the number of bits reserved for the posit exponent
-    global representable_numbers_cache
-    if num in representable_numbers_cache:
-        return True
-    res = False
-    with open(table_folder + "/posit_" + str(p_size) + "_" + str(es_size) + ".csv") as f:
-        for line in f:
-            row = line.rstrip()
-            chunks = row.split(" ")
-            if chunks[-1] == "NaR":
-                continue
-            f = float(chunks[-1])
-            if num == f:
-                # optional feature: save some numbers aside in order to have a chance to avoid reading the file again
-                # useful if you have lots of repetitions, and large lookup table
-                if cache_max_size > 0:
-                    if cache_max_size < len(representable_numbers_cache):
-                        representable_numbers_cache += [f]
-                    if cache_max_size == len(representable_numbers_cache):
-                        # if cache is full, remove the oldest element
-                        representable_numbers_cache = representable_numbers_cache[1:]
-                res = True
-                # returns if True representable, false if not
-    return res
+    if p_size > max_table_bits:
+        # too many numbers to list them: a number is representable if rounding it changes nothing
+        if isinstance(num, float) and (isnan(num) or isinf(num)):
+            return False
+        return exact2posit(*split_real(num, p_size), p_size, es_size)[1]
+    numbers = get_representable_numbers(p_size, es_size)
+    i = bisect_left(numbers, num)
+    # returns if True representable, false if not
+    return i < len(numbers) and numbers[i] == num
+
+
+# find the representable numbers nearest to a number
+def representable_neighbours(num, p_size, es_size):
+    # $ parameters $
+    # $num: float number
+    # $p_size: the number of bits on which the number $bits is represented
+    # $es_size: the number of bits reserved for the posit exponent
+    if p_size > max_table_bits:
+        code, exact = exact2posit(*split_real(num, p_size), p_size, es_size)
+        value = decode_posit(code, p_size, es_size)
+        if exact:
+            return value, value
+        mask = (1 << p_size) - 1
+        nar = 1 << (p_size - 1)
+        if value < num:
+            upper = (code + 1) & mask
+            return value, None if upper == nar else decode_posit(upper, p_size, es_size)
+        lower = (code - 1) & mask
+        return None if lower == nar else decode_posit(lower, p_size, es_size), value
+    numbers = get_representable_numbers(p_size, es_size)
+    i = bisect_left(numbers, num)
+    if i < len(numbers) and numbers[i] == num:
+        return num, num
+    # returns the greatest representable number below num and the smallest above it (None if out of range)
+    return numbers[i - 1] if i > 0 else None, numbers[i] if i < len(numbers) else None
 
 
 # compute additions between two binary numbers
 def binary_sum(max_size, b1, b2):
     # $ parameters $
-    # max_size: length of strings b1 and b2
+    # max_size: number of bits of the result; the carry out of the last bit is discarded
     # $b1: operand as a string
     # $b2: operand as a string
-    res_reversed = []
-    carry = 0
-    res = ""
-    a = 0
-    b = 0
-    for i in range(max_size).__reversed__():
-        if i < len(b1):
-            a = int(b1[i])
-        if i < len(b2):
-            b = int(b2[i])
-        s = carry + a + b
-        if s == 0:
-            carry = 0
-            res_reversed += [0]
-        if s == 1:
-            carry = 0
-            res_reversed += [1]
-        if s == 2:
-            carry = 1
-            res_reversed += [0]
-        if s == 3:
-            carry = 1
-            res_reversed += [1]
-
-    for c in res_reversed.__reversed__():
-        if c == 1:
-            res += "1"
-        else:
-            res += "0"
-
-    while len(res) < max_size:
-        res += "0"
     # return a string of bits representing the result
-    return res
+    return format(modular_sum(int(b1 or "0", 2), int(b2 or "0", 2), max_size), "0" + str(max_size) + "b")
 
 
 # compute subtractions between two binary numbers
 def binary_diff(max_size, b1, b2):
     # $ parameters $
-    # max_size: length of strings b1 and b2
+    # max_size: number of bits of the result, modulo 2^max_size
     # $b1: operand as a string
     # $b2: operand as a string
     # returns the subctraction as a string of bits
-    return binary_sum(max_size, b1, a2comp(b2, len(b2)))
+    return format(modular_diff(int(b1 or "0", 2), int(b2 or "0", 2), max_size), "0" + str(max_size) + "b")
+
+
+# compute additions between integers of p_size bits
+def modular_sum(a, b, p_size=8):
+    # returns a + b modulo 2^p_size
+    return (a + b) & ((1 << p_size) - 1)
+
+
+# compute subtractions between integers of p_size bits
+def modular_diff(a, b, p_size=8):
+    # returns a - b modulo 2^p_size
+    return (a - b) & ((1 << p_size) - 1)
+
+
+# find the encodings some steps away from a posit
+def posit_neighbours(code, steps=1, p_size=8):
+    # $ parameters $
+    # $code: the posit as an unsigned integer of p_size bits
+    # $steps: distance of the neighbours, in posits
+    # $p_size: the number of bits of the posit format
+    # codes wrap around modulo 2^p_size, so the neighbours of maxpos and -maxpos include NaR
+    # returns the codes $steps posits below and above $code
+    return modular_diff(code, steps, p_size), modular_sum(code, steps, p_size)
+
+
+# round a number given as m * 2^scale to the nearest posit
+def exact2posit(m, scale, p_size=8, es_size=0):
+    # $ parameters $
+    # $m: integer mantissa (signed)
+    # $scale: power of two multiplying $m
+    # $p_size: the number of bits of the posit format
+    # $es_size: the number of bits reserved for the posit exponent
+    if m == 0:
+        return 0, True
+    negative = m < 0
+    m = abs(m)
+    exact = True
+    frac_len = m.bit_length() - 1
+    # m * 2^scale = (1.f) * 2^e * useed^k
+    total = frac_len + scale
+    k = total >> es_size
+    e = total & ((1 << es_size) - 1)
+    if k >= p_size - 2:
+        # saturate to maxpos
+        code = (1 << (p_size - 1)) - 1
+        exact = k == p_size - 2 and e == 0 and m == 1 << frac_len
+    elif k < 2 - p_size:
+        # a number different than zero is never rounded to zero: saturate to minpos
+        code = 1
+        exact = False
+    else:
+        if k >= 0:
+            regime = ((1 << (k + 1)) - 1) << 1
+            regime_len = k + 2
+        else:
+            regime = 1
+            regime_len = 1 - k
+        bits = (((regime << es_size) | e) << frac_len) | (m - (1 << frac_len))
+        length = regime_len + es_size + frac_len
+        if length <= p_size - 1:
+            code = bits << (p_size - 1 - length)
+        else:
+            # round to nearest, ties to even, on the bits of the encoding
+            drop = length - (p_size - 1)
+            code = bits >> drop
+            guard = (bits >> (drop - 1)) & 1
+            sticky = bits & ((1 << (drop - 1)) - 1)
+            exact = guard == 0 and sticky == 0
+            if guard and (sticky or code & 1):
+                code += 1
+    if negative:
+        code = -code & ((1 << p_size) - 1)
+    # returns the posit code, and True if no rounding was needed
+    return code, exact
+
+
+# compute A + B*C exactly, and round it to the nearest posit
+def posit_fma(a, b, c, p_size=8, es_size=0, a_size=None):
+    # $ parameters $
+    # $a, $b, $c: posits as integer codes; $a has a_size bits, $b and $c have p_size bits
+    # $p_size: the number of bits of B, C and of the result
+    # $es_size: the number of bits reserved for the posit exponent
+    # $a_size: the number of bits of A (p_size if not given)
+    if a_size is None:
+        a_size = p_size
+    nar = 1 << (p_size - 1)
+    if a == 1 << (a_size - 1) or b == nar or c == nar:
+        return nar, True
+    ma, sa = split_posit(a, a_size, es_size)
+    mb, sb = split_posit(b, p_size, es_size)
+    mc, sc = split_posit(c, p_size, es_size)
+    # the product of the mantissas is exact; align it with A, as a quire would do
+    mp = mb * mc
+    sp = sb + sc
+    if ma == 0:
+        return exact2posit(mp, sp, p_size, es_size)
+    if mp == 0:
+        return exact2posit(ma, sa, p_size, es_size)
+    scale = min(sa, sp)
+    # returns the result code, and True if it is exact
+    return exact2posit((ma << (sa - scale)) + (mp << (sp - scale)), scale, p_size, es_size)
+
+
+# compute A / B exactly, and round it to the nearest posit
+def posit_div(a, b, p_size=8, es_size=0):
+    # $ parameters $
+    # $a, $b: posits as integer codes of p_size bits
+    # $p_size: the number of bits of the operands and of the result
+    # $es_size: the number of bits reserved for the posit exponent
+    nar = 1 << (p_size - 1)
+    mask = (1 << p_size) - 1
+    if a & mask == nar or b & mask in (nar, 0):
+        return nar, True
+    ma, sa = split_posit(a, p_size, es_size)
+    mb, sb = split_posit(b, p_size, es_size)
+    if ma == 0:
+        return 0, True
+    # the quotient of the mantissas keeps a sticky bit, so that it rounds as the exact one (see split_real)
+    m, scale = split_real(Fraction(ma, mb), p_size)
+    # returns the result code, and True if it is exact
+    return exact2posit(m, scale + sa - sb, p_size, es_size)
+
+
+# compute the sum of some products exactly, and round it to the nearest posit
+def posit_dot(xs, ys, p_size=8, es_size=0):
+    # $ parameters $
+    # $xs, $ys: sequences of posits as integer codes of p_size bits, multiplied element by element
+    # $p_size: the number of bits of the operands and of the result
+    # $es_size: the number of bits reserved for the posit exponent
+    nar = 1 << (p_size - 1)
+    terms = []
+    for x, y in zip(xs, ys):
+        if x == nar or y == nar:
+            return nar, True
+        mx, sx = split_posit(x, p_size, es_size)
+        my, sy = split_posit(y, p_size, es_size)
+        if mx != 0 and my != 0:
+            terms.append((mx * my, sx + sy))
+    if not terms:
+        return 0, True
+    # the products are aligned to the smallest scale and summed without rounding
+    scale = min(s for _, s in terms)
+    # returns the result code, and True if it is exact
+    return exact2posit(sum(m << (s - scale) for m, s in terms), scale, p_size, es_size)
+
+
+# distance between two posits, as the number of posits in between plus one
+def code_distance(p1, p2, p_size=8):
+    # $ parameters $
+    # $p1, $p2: posits as integer codes of p_size bits
+    # posits are ordered as the signed integers with the same bits
+    half = 1 << (p_size - 1)
+    # returns a non negative integer
+    return abs(((p1 + half) & ((half << 1) - 1)) - ((p2 + half) & ((half << 1) - 1)))
 
@@ -0,0 +1,346 @@
+# ---------------------------------------------------------------
+import numpy as np
+
+import simplePositLib
+
+# ---------------------------------------------------------------
+# NumPy version of some simplePositLib functions, working on whole arrays of posits
+# ---------------------------------------------------------------
+# Usage Example:
+#   # put the posit codes (as unsigned integers) in a NumPy array
+#   codes = np.array([0x40, 0x7f, 0xc0], dtype=np.uint64)
+#   # you can convert all of them in real numbers at once
+#   values = decode_posits(codes, N, ES)
+# ---------------------------------------------------------------
+# List of functions:
+#
+#   >> bit_length(x):
+#       number of bits needed to represent each element of an uint64 array
+#
+#   >> decode_posits(codes, p_size=8, es_size=0):
+#       convert an array of posit codes in an array of float64, with the same results of simplePositLib.decode_posit
+#       formats up to simplePositLib.max_table_bits use its lookup table, wider formats are decoded arithmetically
+#
+#   >> posit_fields(codes, p_size=8, es_size=0):
+#       extract sign, regime k, exponent and fraction bits of an array of posit codes
+#
+#   >> bits2codes(digits, bits_per_digit):
+#       pack a matrix of digit values (one row per number, most significant digit first) in an uint64 array
+#
+#   >> codes2bits(codes, width, bits_per_digit):
+#       split an array of numbers in a matrix of digit values, the inverse of bits2codes
+#
+#   >> encode_posits(values, p_size=8, es_size=0):
+#       convert an array of float64 in an array of posit codes, with the same results of simplePositLib.encode_posit
+#
+#   >> is_representable(values, p_size=8, es_size=0):
+#       check which elements of an array of float64 are posits of a format, without lookup tables
+#
+#   >> fma_posits(a, b, c, p_size=8, es_size=0, a_size=None):
+#       compute A + B*C for arrays of posit codes rounding only once, with the same results of simplePositLib.posit_fma
+#       the sum is computed in float64 with its exact error; lines float64 cannot hold exactly use posit_fma
+#
+#   >> round_sum(x, y, p_size=8, es_size=0):
+#       round the exact sum of two arrays of float64 to posit codes, rounding only once (used by fma_posits)
+#
+#   >> dot_posits(a, b, c, d, p_size=8, es_size=0):
+#       compute A*B + C*D for arrays of posit codes rounding only once, with the same results of
+#       simplePositLib.posit_dot
+#
+#   >> div_posits(a, b, p_size=8, es_size=0):
+#       compute A / B for arrays of posit codes rounding only once, with the same results of simplePositLib.posit_div
+#       the quotient is computed in float64; quotients landing on a posit or on a halfway value use posit_div
+#
+#   >> code_distances(p1, p2, p_size=8):
+#       distance between two arrays of posit codes, with the same results of simplePositLib.code_distance
+#
+# ---------------------------------------------------------------
+# ---------------------------------------------------------------
+# ------------------ internal variables: ------------------------
+_one = np.uint64(1)
+
+
+# ---------------------------------------------------------------
+# ---------------- function implementation: ---------------------
+# function: compute the number of bits needed to represent each element of an array
+def bit_length(x):
+    # $ parameters $
+    # $x: array of unsigned integers (up to 64 bits)
+    x = np.asarray(x, dtype=np.uint64)
+    n = np.zeros(x.shape, dtype=np.int64)
+    # binary search of the most significant bit
+    for shift in (32, 16, 8, 4, 2, 1):
+        big = x >= (_one << np.uint64(shift))
+        x = np.where(big, x >> np.uint64(shift), x)
+        n += big * shift
+    # returns an int64 array, same as int.bit_length for each element
+    return n + x.astype(np.int64)
+
+
+# function: convert an array of posit codes in an array of real numbers
+def decode_posits(codes, p_size=8, es_size=0):
+    # $ parameters $
+    # $codes: array of posits as unsigned integers of p_size bits
+    # $p_size: the number of bits on which the numbers in $codes are represented
+    # $es_size: the number of bits reserved for the posit exponent
+    codes = np.asarray(codes, dtype=np.uint64)
+    if p_size <= simplePositLib.max_table_bits:
+        # one gather from the lookup table
+        return np.frombuffer(simplePositLib.get_decode_table(p_size, es_size), dtype=np.float64)[codes]
+    negative, k, e, frac_len, f = posit_fields(codes, p_size, es_size)
+    mantissa = ((_one << frac_len.astype(np.uint64)) | f).astype(np.float64)
+    values = np.ldexp(mantissa, (k << es_size) + e - frac_len)
+    values = np.where(negative, -values, values)
+    values[(codes & np.uint64((1 << p_size) - 1)) == 0] = 0.0
+    # returns a float64 array
+    return values
+
+
+# function: extract the fields of an array of posit codes
+def posit_fields(codes, p_size=8, es_size=0):
+    # $ parameters $
+    # $codes: array of posits as unsigned integers of p_size bits
+    # $p_size: the number of bits on which the numbers in $codes are represented
+    # $es_size: the number of bits reserved for the posit exponent
+    codes = np.asarray(codes, dtype=np.uint64)
+    mask = np.uint64((1 << p_size) - 1)
+    codes = codes & mask
+    negative = (codes >> np.uint64(p_size - 1)).astype(bool)
+    # two's complement of negative posits; NaR stays as it is
+    magnitude = np.where(negative, (~codes + _one) & mask, codes)
+    body_len = p_size - 1
+    body_mask = mask >> _one
+    body = magnitude & body_mask
+    # regime: run of ones (k = run - 1) or of zeroes (k = -run) at the head of the body
+    ones = (body >> np.uint64(body_len - 1)).astype(bool)
+    run = body_len - bit_length(np.where(ones, ~body & body_mask, body))
+    k = np.where(ones, run - 1, -run)
+    # exponent and fraction are the bits after the regime terminating bit
+    rest_len = np.maximum(body_len - run - 1, 0)
+    rest = body & ((_one << rest_len.astype(np.uint64)) - _one)
+    frac_len = np.maximum(rest_len - es_size, 0)
+    cut = np.maximum(es_size - rest_len, 0)
+    # exponent bits cut by the regime are zeroes
+    e = ((rest >> frac_len.astype(np.uint64)) << cut.astype(np.uint64)).astype(np.int64)
+    f = rest & ((_one << frac_len.astype(np.uint64)) - _one)
+    # returns sign (True if negative), regime k, exponent e, number of fraction bits, fraction bits
+    return negative, k, e, frac_len, f
+
+
+# function: pack digits in numbers
+def bits2codes(digits, bits_per_digit):
+    # $ parameters $
+    # $digits: 2D array of digit values, one number per row, most significant digit first
+    # $bits_per_digit: 1 for binary digits, 4 for hexadecimal digits
+    digits = np.asarray(digits, dtype=np.uint64)
+    width = digits.shape[1]
+    shifts = (np.arange(width - 1, -1, -1, dtype=np.uint64) * np.uint64(bits_per_digit))
+    # returns an uint64 array with one number per row
+    return np.bitwise_or.reduce(digits << shifts, axis=1) if width else np.zeros(digits.shape[0], np.uint64)
+
+
+# function: split numbers in digits
+def codes2bits(codes, width, bits_per_digit):
+    # $ parameters $
+    # $codes: array of unsigned integers
+    # $width: number of digits of each number
+    # $bits_per_digit: 1 for binary digits, 4 for hexadecimal digits
+    codes = np.asarray(codes, dtype=np.uint64)
+    shifts = (np.arange(width - 1, -1, -1, dtype=np.uint64) * np.uint64(bits_per_digit))
+    # returns an uint8 2D array with the digits of one number per row, most significant digit first
+    return ((codes[:, None] >> shifts) & np.uint64((1 << bits_per_digit) - 1)).astype(np.uint8)
+
+
+# function: round an array of real numbers to posit codes
+def round_posits(values, p_size=8, es_size=0):
+    # $ parameters $
+    # $values: array of float64
+    # $p_size: the number of bits of the posit format (up to 64)
+    # $es_size: the number of bits reserved for the posit exponent (up to 11)
+    values = np.asarray(values, dtype=np.float64)
+    mask = np.uint64((1 << p_size) - 1)
+    mantissa, exponent = np.frexp(np.abs(values))
+    # |value| = 1.f * 2^t, with 52 bits of fraction f
+    t = exponent.astype(np.int64) - 1
+    # NaN and infinities are cast to meaningless fractions: their codes are replaced with NaR below
+    with np.errstate(invalid="ignore"):
+        frac = (np.ldexp(mantissa, 53).astype(np.uint64)) & np.uint64((1 << 52) - 1)
+    k = t >> es_size
+    e = (t & ((1 << es_size) - 1)).astype(np.uint64)
+    # exponent and fraction bits after the regime, rounded to the bits left by the regime
+    tail = (e << np.uint64(52)) | frac
+    tail_len = es_size + 52
+    k_in = np.clip(k, 2 - p_size, p_size - 3)
+    regime_len = np.where(k_in >= 0, k_in + 2, 1 - k_in)
+    regime = np.where(k_in >= 0, ((_one << (k_in + 1).astype(np.uint64)) - _one) << _one, _one)
+    available = p_size - 1 - regime_len
+    drop = np.maximum(tail_len - available, 0).astype(np.uint64)
+    kept = np.where(available > tail_len, tail << np.maximum(available - tail_len, 0).astype(np.uint64),
+                    tail >> drop)
+    guard = np.where(drop > 0, (tail >> np.maximum(drop, _one) - _one) & _one, 0).astype(np.uint64)
+    sticky = (drop > 1) & ((tail & ((_one << np.maximum(drop, _one) - _one) - _one)) != 0)
+    body = (regime << available.astype(np.uint64)) | kept
+    body += guard & (sticky | (body & _one)).astype(np.uint64)
+    exact = (guard == 0) & ~sticky
+    # out of range: saturate to maxpos and minpos
+    maxpos = np.uint64((1 << (p_size - 1)) - 1)
+    body = np.where(k > p_size - 3, maxpos, body)
+    exact = np.where(k > p_size - 3, (k == p_size - 2) & (tail == 0), exact)
+    body = np.where(k < 2 - p_size, _one, body)
+    exact &= k >= 2 - p_size
+    codes = np.where(values < 0, (~body + _one) & mask, body)
+    codes = np.where(values == 0, np.uint64(0), codes)
+    exact |= values == 0
+    special = ~np.isfinite(values)
+    codes = np.where(special, np.uint64(1 << (p_size - 1)), codes)
+    # returns the codes as uint64, and which values are exactly represented
+    return codes, exact & ~special
+
+
+# function: convert an array of real numbers in an array of posit codes
+def encode_posits(values, p_size=8, es_size=0):
+    # $ parameters $
+    # $values: array of float64 (NaN and infinities are converted to NaR)
+    # $p_size: the number of bits of the posit format (up to 64)
+    # $es_size: the number of bits reserved for the posit exponent (up to 11)
+    # returns an uint64 array of codes (ties to even, saturating to minpos/maxpos)
+    return round_posits(values, p_size, es_size)[0]
+
+
+# function: check which elements of an array are representable as posits
+def is_representable(values, p_size=8, es_size=0):
+    # $ parameters $
+    # $values: array of float64
+    # $p_size: the number of bits of the posit format (up to 64)
+    # $es_size: the number of bits reserved for the posit exponent (up to 11)
+    # returns a boolean array
+    return round_posits(values, p_size, es_size)[1]
+
+
+# function: round the exact sum of two arrays of real numbers to posit codes, rounding only once
+def round_sum(x, y, p_size=8, es_size=0):
+    # $ parameters $
+    # $x, $y: arrays of float64, holding the exact values of the two terms
+    # $p_size: the number of bits of the result (up to 32)
+    # $es_size: the number of bits reserved for the posit exponent
+    with np.errstate(invalid="ignore", over="ignore"):
+        # sum and its rounding error (TwoSum): s + t is exactly x + y
+        s = x + y
+        z = s - x
+        t = (x - (s - z)) + (y - z)
+    codes, exact = round_posits(s, p_size, es_size)
+    # a sum exactly halfway between two posits is moved towards its error: halfway values are the odd codes of the
+    # format with one more bit, and the next posit is far more than one float64 away from them
+    half, on_half = round_posits(s, p_size + 1, es_size)
+    tie = on_half & ((half & _one) == _one) & (t != 0)
+    if np.any(tie):
+        codes[tie] = round_posits(np.nextafter(s[tie], np.where(t[tie] > 0, np.inf, -np.inf)), p_size, es_size)[0]
+    exact &= t == 0
+    # returns the codes as uint64, which results are exact, and which sums did not overflow
+    return codes, exact, np.isfinite(s) & np.isfinite(t)
+
+
+# function: compute A + B*C for arrays of posits, rounding the exact result only once
+def fma_posits(a, b, c, p_size=8, es_size=0, a_size=None):
+    # $ parameters $
+    # $a, $b, $c: arrays of posit codes; $a has a_size bits, $b and $c have p_size bits
+    # $p_size: the number of bits of B, C and of the result (up to 32)
+    # $es_size: the number of bits reserved for the posit exponent
+    # $a_size: the number of bits of A (p_size if not given)
+    if a_size is None:
+        a_size = p_size
+    a = np.asarray(a, dtype=np.uint64)
+    b = np.asarray(b, dtype=np.uint64)
+    c = np.asarray(c, dtype=np.uint64)
+    a_f = decode_posits(a, a_size, es_size)
+    b_f = decode_posits(b, p_size, es_size)
+    c_f = decode_posits(c, p_size, es_size)
+    with np.errstate(invalid="ignore", over="ignore"):
+        product = b_f * c_f
+    codes, exact, finite = round_sum(a_f, product, p_size, es_size)
+    # float64 holds A and B*C exactly if they have at most 53 significant bits and stay away from under/overflow
+    a_frac = posit_fields(a, a_size, es_size)[3]
+    b_frac = posit_fields(b, p_size, es_size)[3]
+    c_frac = posit_fields(c, p_size, es_size)[3]
+    tiny = 2.0 ** -900
+    reliable = ((a_frac <= 52) & (b_frac + c_frac <= 51) & finite
+                & ((np.abs(a_f) >= tiny) | (a_f == 0)) & ((np.abs(product) >= tiny) | (product == 0)))
+    nar = (a == np.uint64(1 << (a_size - 1))) | (b == np.uint64(1 << (p_size - 1))) | (c == np.uint64(1 << (p_size - 1)))
+    codes[nar] = np.uint64(1 << (p_size - 1))
+    exact[nar] = True
+    for i in np.flatnonzero(~reliable & ~nar).tolist():
+        codes[i], exact[i] = simplePositLib.posit_fma(int(a[i]), int(b[i]), int(c[i]), p_size, es_size, a_size)
+    # returns the result codes as uint64, and which results are exact
+    return codes, exact
+
+
+# function: compute A*B + C*D for arrays of posits, rounding the exact result only once
+def dot_posits(a, b, c, d, p_size=8, es_size=0):
+    # $ parameters $
+    # $a, $b, $c, $d: arrays of posit codes of p_size bits
+    # $p_size: the number of bits of the operands and of the result (up to 32)
+    # $es_size: the number of bits reserved for the posit exponent
+    a, b, c, d = (np.asarray(x, dtype=np.uint64) for x in (a, b, c, d))
+    values = [decode_posits(x, p_size, es_size) for x in (a, b, c, d)]
+    fracs = [posit_fields(x, p_size, es_size)[3] for x in (a, b, c, d)]
+    with np.errstate(invalid="ignore", over="ignore", under="ignore"):
+        first = values[0] * values[1]
+        second = values[2] * values[3]
+    codes, exact, finite = round_sum(first, second, p_size, es_size)
+    # both products are exact in float64, as in fma_posits
+    tiny = 2.0 ** -900
+    reliable = ((fracs[0] + fracs[1] <= 51) & (fracs[2] + fracs[3] <= 51) & finite
+                & ((np.abs(first) >= tiny) | (first == 0)) & ((np.abs(second) >= tiny) | (second == 0)))
+    nar_code = np.uint64(1 << (p_size - 1))
+    nar = (a == nar_code) | (b == nar_code) | (c == nar_code) | (d == nar_code)
+    codes[nar] = nar_code
+    exact[nar] = True
+    for i in np.flatnonzero(~reliable & ~nar).tolist():
+        codes[i], exact[i] = simplePositLib.posit_dot((int(a[i]), int(c[i])), (int(b[i]), int(d[i])), p_size,
+                                                      es_size)
+    # returns the result codes as uint64, and which results are exact
+    return codes, exact
+
+
+# function: compute A / B for arrays of posits, rounding the exact quotient only once
+def div_posits(a, b, p_size=8, es_size=0):
+    # $ parameters $
+    # $a, $b: arrays of posit codes of p_size bits
+    # $p_size: the number of bits of the operands and of the result (up to 32)
+    # $es_size: the number of bits reserved for the posit exponent
+    a = np.asarray(a, dtype=np.uint64)
+    b = np.asarray(b, dtype=np.uint64)
+    a_f = decode_posits(a, p_size, es_size)
+    b_f = decode_posits(b, p_size, es_size)
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore", under="ignore"):
+        q = a_f / b_f
+    codes, exact = round_posits(q, p_size, es_size)
+    # the float64 quotient is the exact one correctly rounded, and every posit and every halfway value is a float64:
+    # it rounds as the exact quotient, unless it lands on a posit or on a halfway value, where the exact quotient
+    # might be on either side of it
+    half, on_half = round_posits(q, p_size + 1, es_size)
+    tie = on_half & ((half & _one) == _one)
+    reliable = (((~exact & ~tie & np.isfinite(q) & (np.abs(q) >= 2.0 ** -900)) | (a_f == 0))
+                & (b_f != 0))
+    nar_code = np.uint64(1 << (p_size - 1))
+    nar = (a == nar_code) | (b == nar_code) | ((b & np.uint64((1 << p_size) - 1)) == 0)
+    codes[nar] = nar_code
+    exact[nar] = True
+    for i in np.flatnonzero(~reliable & ~nar).tolist():
+        codes[i], exact[i] = simplePositLib.posit_div(int(a[i]), int(b[i]), p_size, es_size)
+    # returns the result codes as uint64, and which results are exact
+    return codes, exact
+
+
+# function: compute the distance between two arrays of posits, as the number of posits in between plus one
+def code_distances(p1, p2, p_size=8):
+    # $ parameters $
+    # $p1, $p2: arrays of posit codes of p_size bits
+    # $p_size: the number of bits of the posits (up to 64)
+    # posits are ordered as the signed integers with the same bits
+    half = np.uint64(1 << (p_size - 1))
+    mask = np.uint64((1 << p_size) - 1)
+    x = (np.asarray(p1, dtype=np.uint64) + half) & mask
+    y = (np.asarray(p2, dtype=np.uint64) + half) & mask
+    # returns an uint64 array
+    return np.where(x >= y, x - y, y - x)
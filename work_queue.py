@@ -0,0 +1,254 @@
+# work queue handing out tasks to worker processes through a socket, on this machine or on other ones
+# ---------------------------------------------------------------
+# the coordinator listens on an address; workers connect to it, take a task at a time, run it and send its result
+# back. The task of a worker that dies (its connection is lost), fails (its function raises) or takes too long is
+# given to another worker, up to a number of retries; the results are returned in the order of the tasks
+# messages are pickled by multiprocessing.connection, after an authentication with a key shared by the coordinator
+# and its workers: tasks and results must be picklable, and the workers must run the same code (and read the same
+# files, e.g. from a shared folder)
+# unpickling runs code: whoever knows the key can run code on the coordinator and on the workers. A coordinator
+# listening on localhost may pick a random key (its local workers get it); any other address needs a secret key
+# usage:
+#   with Coordinator(tasks, ("localhost", 0), None, local_workers=4, function=work) as coordinator:
+#       for result in coordinator.results():    # results of work(task), in the order of the tasks
+#           ...
+#   run_worker(("coordinator-host", 6000), b"secret key", work)  # on any machine reaching the coordinator
+import traceback
+from collections import deque
+from ipaddress import ip_address
+from multiprocessing import AuthenticationError, get_context
+from multiprocessing.connection import Client, Listener
+from os import urandom
+from threading import Condition, Thread
+from time import monotonic, sleep
+
+# ---------------------------------------------------------------
+# ----------------------- CONFIGURATION -------------------------
+task_retries = 3  # times a task is given again after its worker died, failed or timed out
+task_timeout = -1  # seconds after which a task is given to another worker; -1 to wait for its worker
+connect_interval = 1  # seconds between two connection attempts of a worker
+connect_backlog = 64  # connections of workers waiting to be accepted
+check_interval = 1  # seconds between two checks of the timeouts, and of the local workers still running
+
+
+# ---------------------------------------------------------------
+# ------------------------- FUNCTIONS ---------------------------
+# address of a "host:port" string, as Listener and Client take it
+def parse_address(text):
+    host, _, port = text.rpartition(":")
+    return host or "localhost", int(port)
+
+
+# True if a host name or address can only be reached from this machine
+def is_loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return ip_address(host).is_loopback
+    except ValueError:
+        # a host name other than localhost might resolve to any address
+        return False
+
+
+# tasks handed out by a coordinator, and their results until they are returned
+class Coordinator:
+    def __init__(self, tasks, address, authkey, local_workers=0, function=None, retries=task_retries,
+                 timeout=task_timeout):
+        # $address: (host, port) where the workers connect; port 0 picks a free port (see Coordinator.address)
+        # $authkey: key of the workers, as bytes; None for a random key, only on a loopback address
+        # $local_workers: worker processes started on this machine, running $function
+        if authkey is None:
+            if not is_loopback(address[0]):
+                raise ValueError("a key shared with the workers is required to listen on " + str(address[0]))
+            authkey = urandom(32)
+        self.tasks = list(tasks)
+        self.authkey = authkey
+        self.retries = retries
+        self.timeout = timeout
+        self.pending = deque(range(len(self.tasks)))  # tasks waiting for a worker, the ones to retry first
+        self.running = {}  # task -> start of its last attempt
+        self.failures = [0] * len(self.tasks)
+        self.finished = set()
+        self.results_left = {}  # task -> result, until it is returned
+        self.error = None  # why the work has been given up
+        self.closed = False
+        self.condition = Condition()
+        self.listener = Listener(address, backlog=connect_backlog, authkey=authkey)
+        self.address = self.listener.address
+        self.workers_seen = 0
+        self.connected = 0  # workers connected now
+        Thread(target=self.accept, daemon=True).start()
+        # local workers are spawned, not forked: a forked worker would keep the socket of the listener open
+        self.local_workers = [get_context("spawn").Process(target=run_worker, args=(self.address, authkey, function, 0))
+                              for _ in range(local_workers)]
+        for process in self.local_workers:
+            process.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # accept the connections of the workers, serving each one in a thread of its own
+    def accept(self):
+        while not self.closed:
+            try:
+                connection = self.listener.accept()
+            except (AuthenticationError, EOFError, ConnectionError):
+                # a connection closed or refused during the authentication
+                continue
+            except OSError:
+                return
+            if self.closed:
+                connection.close()
+                return
+            self.workers_seen += 1
+            Thread(target=self.serve, args=(connection,), daemon=True).start()
+
+    # hand out tasks to a worker until there are none left, or its connection is lost
+    def serve(self, connection):
+        index = None
+        with self.condition:
+            self.connected += 1
+        try:
+            with connection:
+                while True:
+                    # ("ready",), ("done", task, result) or ("failed", task, reason)
+                    message = connection.recv()
+                    if message[0] == "done":
+                        self.finish(message[1], message[2])
+                    elif message[0] == "failed":
+                        self.fail(message[1], message[2])
+                    index = self.take()
+                    connection.send(None if index is None else (index, self.tasks[index]))
+                    if index is None:
+                        return
+        except (EOFError, OSError):
+            # the worker died: its task is given to another worker
+            if index is not None:
+                self.fail(index, "connection to the worker lost")
+        finally:
+            with self.condition:
+                self.connected -= 1
+                self.condition.notify_all()
+
+    # next task for a worker, waiting while the tasks left are running; None when the work is over
+    def take(self):
+        with self.condition:
+            while not self.pending and not self.closed and self.error is None:
+                self.condition.wait()
+            if self.closed or self.error is not None:
+                return None
+            index = self.pending.popleft()
+            self.running[index] = monotonic()
+            # returns the index of the task
+            return index
+
+    # store the result of a task; results of tasks already finished by another worker are ignored
+    def finish(self, index, result):
+        with self.condition:
+            self.running.pop(index, None)
+            if index not in self.finished:
+                self.finished.add(index)
+                self.results_left[index] = result
+            self.condition.notify_all()
+
+    # give a task to another worker, unless it has already failed too many times
+    def fail(self, index, reason):
+        with self.condition:
+            if index in self.finished or index in self.pending:
+                return
+            self.running.pop(index, None)
+            self.failures[index] += 1
+            if self.failures[index] > self.retries:
+                self.error = "task " + str(index) + " failed " + str(self.failures[index]) + " times: " + reason
+            else:
+                self.pending.appendleft(index)
+            self.condition.notify_all()
+
+    # give the tasks running for longer than the timeout to other workers
+    def expire(self):
+        now = monotonic()
+        for index, start in list(self.running.items()):
+            if now - start > self.timeout:
+                self.fail(index, "timed out after " + str(self.timeout) + " s")
+
+    # give up the work when the local workers have all exited and no other worker is connected: no one is left to
+    # run the tasks (e.g. the local workers have been killed)
+    def check_workers(self):
+        if self.local_workers and self.connected == 0 and not any(p.is_alive() for p in self.local_workers):
+            self.error = ("all the local workers exited with tasks left (exit codes: "
+                          + ", ".join(str(p.exitcode) for p in self.local_workers) + ")")
+
+    # results of the tasks, in their order, as soon as they are available
+    def results(self):
+        wait = check_interval if self.timeout >= 0 or self.local_workers else None
+        for index in range(len(self.tasks)):
+            with self.condition:
+                while index not in self.results_left:
+                    if self.error is not None:
+                        raise RuntimeError(self.error)
+                    self.condition.wait(wait)
+                    if self.timeout >= 0:
+                        self.expire()
+                    self.check_workers()
+                result = self.results_left.pop(index)
+            yield result
+
+    # stop handing out tasks: connected workers are told the work is over when they finish their task, local workers
+    # are waited for
+    def close(self):
+        if self.closed:
+            return
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        # a last connection wakes up the thread accepting them
+        try:
+            Client(self.address, authkey=self.authkey).close()
+        except OSError:
+            pass
+        self.listener.close()
+        for process in self.local_workers:
+            # a local worker still running a task after the timeout is stuck
+            process.join(self.timeout if self.timeout >= 0 else None)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+
+
+# run the tasks of a coordinator with a function, until the coordinator has no more work
+# with $idle >= 0, the worker stops when no coordinator can be reached for $idle seconds (0: after the first one)
+def run_worker(address, authkey, function, idle=-1):
+    tasks_run = 0
+    since = monotonic()
+    while True:
+        try:
+            connection = Client(address, authkey=authkey)
+        except OSError:
+            if idle >= 0 and monotonic() - since >= idle:
+                break
+            sleep(connect_interval)
+            continue
+        with connection:
+            message = ("ready",)
+            while True:
+                try:
+                    connection.send(message)
+                    task = connection.recv()
+                except (EOFError, OSError):
+                    break
+                if task is None:
+                    break
+                index, arguments = task
+                try:
+                    message = ("done", index, function(arguments))
+                except Exception:
+                    message = ("failed", index, traceback.format_exc())
+                tasks_run += 1
+        since = monotonic()
+        if idle == 0:
+            break
+    # returns the number of tasks run
+    return tasks_run